@@ -1,15 +1,20 @@
+import time
+_STARTED = time.time()  # For YTFAST_STARTUP_REPORT, before the slow imports
+
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import yt_dlp
-import threading
-import queue
-import time
+import collections
+import json
 import uuid
 import sys
 import os
 import subprocess
 import platform
+import multiprocessing
+
+from ytfast_core import (DownloadManager, DownloadArchive, ExtractionPool, InfoCache, MetricsServer, RemoteManager,
+                         TaskJournal, UpdateBus, FINISHED_STATUSES, PHASES, app_data_dir, connect_daemon, parse_urls)
 
 # -----------------------------------------------------------------------------
 # HELPER: RESOURCE PATH (Fixes Font in .EXE)
@@ -65,154 +70,53 @@ COLOR_TEXT_GRAY = "#AAAAAA"
 COLOR_ERROR = "#CF6679"
 COLOR_INPUT_BG = "#12121f"
 
-# -----------------------------------------------------------------------------
-# LOGIC & WORKER
-# -----------------------------------------------------------------------------
+# Download list: rows only exist for what's on screen, old finished entries get dropped
+ROW_HEIGHT = 105     # One row incl. padding, in px
+HISTORY_LIMIT = 500  # Finished downloads kept in the list
 
-class DownloadManager:
-    def __init__(self, update_callback):
-        self.queue = queue.Queue()
-        self.current_task = None
-        self.cancelled_ids = set() 
-        self.cancel_flag = threading.Event()
-        self.update_callback = update_callback
-        self.is_running = True
-        
-        self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
-        self.worker_thread.start()
-
-    def add_task(self, url, settings, task_id):
-        self.queue.put({
-            'url': url,
-            'settings': settings,
-            'id': task_id
-        })
-
-    def cancel_task(self, task_id):
-        self.cancelled_ids.add(task_id)
-        if self.current_task and self.current_task['id'] == task_id:
-            self.cancel_flag.set()
-
-    def _worker_loop(self):
-        while self.is_running:
-            try:
-                task = self.queue.get(timeout=1)
-            except queue.Empty:
-                continue
-
-            if task['id'] in self.cancelled_ids:
-                self.update_callback(task['id'], "status", "Cancelled")
-                self.queue.task_done()
-                continue
-
-            self.current_task = task
-            self.cancel_flag.clear()
-            
-            self.update_callback(task['id'], "status", "Initializing...")
-            self.update_callback(task['id'], "progress", 0.0)
-
-            try:
-                self._process_download(task)
-                if not self.cancel_flag.is_set():
-                    self.update_callback(task['id'], "status", "Completed")
-                    self.update_callback(task['id'], "progress", 1.0)
-                else:
-                    self.update_callback(task['id'], "status", "Cancelled")
-            except Exception as e:
-                err_msg = str(e)
-                if "Cancelled" in err_msg:
-                    self.update_callback(task['id'], "status", "Cancelled")
-                else:
-                    print(f"Error: {e}")
-                    self.update_callback(task['id'], "status", "Error")
-            finally:
-                self.queue.task_done()
-                self.current_task = None
-                if task['id'] in self.cancelled_ids:
-                    self.cancelled_ids.remove(task['id'])
-
-    def _progress_hook(self, d, task_id):
-        if self.cancel_flag.is_set():
-            raise Exception("Cancelled by user")
-
-        if d['status'] == 'downloading':
-            try:
-                p = d.get('_percent_str', '0%').replace('%','')
-                progress = float(p) / 100
-                self.update_callback(task_id, "progress", progress)
-                self.update_callback(task_id, "status", f"Downloading... {d.get('_percent_str')}")
-            except:
-                pass
-        elif d['status'] == 'finished':
-            self.update_callback(task_id, "status", "Processing...")
-
-    def _process_download(self, task):
-        url = task['url']
-        mode = task['settings']['mode'] 
-        quality = task['settings'].get('quality', 'best')
-        path = task['settings'].get('path', os.getcwd())
-
-        ydl_opts = {
-            'progress_hooks': [lambda d: self._progress_hook(d, task['id'])],
-            'outtmpl': '%(title)s.%(ext)s',
-            'paths': {'home': path}, 
-            'quiet': True,
-            'no_warnings': True,
-            'http_headers': {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'},
-            'concurrent_fragment_downloads': 4,
-        }
-
-        if mode == 'audio':
-            ydl_opts.update({
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'm4a',
-                    'preferredquality': '192',
-                },
-                {
-                    'key': 'FFmpegMetadata',
-                    'add_metadata': False,
-                }],
-                'writethumbnail': False,
-            })
-        else:
-            if quality != 'best':
-                fmt = f"bestvideo[height<={quality}][vcodec^=avc]+bestaudio[acodec^=mp4a]/bestvideo[height<={quality}]+bestaudio/best[height<={quality}]"
-            else:
-                fmt = "bestvideo[vcodec^=avc]+bestaudio[acodec^=mp4a]/bestvideo+bestaudio/best"
-            
-            ydl_opts.update({
-                'format': fmt,
-                'merge_output_format': 'mp4',
-                'postprocessors': [{
-                    'key': 'FFmpegVideoConvertor',
-                    'preferedformat': 'mp4',
-                }],
-            })
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            if self.cancel_flag.is_set(): raise Exception("Cancelled")
-            
-            info = ydl.extract_info(url, download=False)
-            title = info.get('title', 'Unknown Title')
-            self.update_callback(task['id'], "title", title)
-            
-            if self.cancel_flag.is_set(): raise Exception("Cancelled")
-            
-            ydl.download([url])
+# UI refresh: worker updates are coalesced and applied at this rate (25 Hz)
+UI_REFRESH_MS = 40
+
+# Global download speed cap choices (bytes/sec)
+SPEED_LIMITS = {
+    "No Limit": None,
+    "1 MB/s": 1024 ** 2,
+    "5 MB/s": 5 * 1024 ** 2,
+    "10 MB/s": 10 * 1024 ** 2,
+    "25 MB/s": 25 * 1024 ** 2,
+}
+
+# Queue lanes for new downloads (display name -> scheduler lane)
+PRIORITIES = {"High": "high", "Normal": "normal", "Low": "low"}
 
 # -----------------------------------------------------------------------------
 # GUI COMPONENTS
 # -----------------------------------------------------------------------------
 
+class TaskRecord:
+    """ Everything a download row shows, kept apart from the (recycled) row widgets """
+    __slots__ = ('task_id', 'title', 'status', 'progress', 'path')
+
+    def __init__(self, task_id, title, path):
+        self.task_id = task_id
+        self.title = title
+        self.status = "Queued"
+        self.progress = 0.0
+        self.path = path
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
 class DownloadItemFrame(ctk.CTkFrame):
-    def __init__(self, master, task_id, url, cancel_command, open_command, **kwargs):
+    def __init__(self, master, cancel_command, open_command, menu_command=None, **kwargs):
         super().__init__(master, fg_color="#12121f", corner_radius=25, **kwargs)
-        self.task_id = task_id
+        self.task_id = None
         self.cancel_command = cancel_command
         self.open_command = open_command
+        self.menu_command = menu_command
         self.download_path = ""
+        self.look = "active"
         
         self.grid_columnconfigure(1, weight=1)
 
@@ -221,7 +125,7 @@ class DownloadItemFrame(ctk.CTkFrame):
         self.icon_lbl.grid(row=0, column=0, rowspan=2, padx=15, pady=15)
 
         # Title / URL
-        self.title_lbl = ctk.CTkLabel(self, text=url, font=APP_FONT, text_color=COLOR_TEXT, anchor="w")
+        self.title_lbl = ctk.CTkLabel(self, text="", font=APP_FONT, text_color=COLOR_TEXT, anchor="w")
         self.title_lbl.grid(row=0, column=1, sticky="ew", padx=(0, 10), pady=(12, 0))
 
         # Status
@@ -239,10 +143,26 @@ class DownloadItemFrame(ctk.CTkFrame):
         self.progress_bar.set(0)
         self.progress_bar.grid(row=2, column=0, columnspan=3, sticky="ew", padx=15, pady=(0, 15))
 
+        # Right click: queue menu (priority, pin, move)
+        for widget in (self, self.icon_lbl, self.title_lbl, self.status_lbl):
+            widget.bind("<Button-3>", self._on_menu_click)
+
+    def bind_record(self, record):
+        """ Point this row at another task """
+        self.task_id = record.task_id
+        self.set_path(record.path)
+        self.update_title(record.title)
+        self.update_progress(record.progress)
+        self.update_status(record.status)
+
     def _on_cancel_click(self):
         if self.cancel_command:
             self.cancel_command(self.task_id)
 
+    def _on_menu_click(self, event):
+        if self.menu_command and self.task_id:
+            self.menu_command(self.task_id, event)
+
     def _on_open_click(self):
         if self.open_command:
             self.open_command(self.download_path)
@@ -252,16 +172,29 @@ class DownloadItemFrame(ctk.CTkFrame):
 
     def update_status(self, text):
         self.status_lbl.configure(text=text)
-        if text == "Completed":
+
+        # Rows get recycled, so every look has to be fully restorable
+        look = text if text in FINISHED_STATUSES else "active"
+        if look == self.look:
+            return
+        self.look = look
+
+        if text in ("Completed", "Already downloaded"):
             self.progress_bar.configure(progress_color=COLOR_ACCENT)
             # Switch to Folder Icon
-            self.action_btn.configure(text="📂", fg_color="#12121f", hover_color="#0b0b14", 
+            self.action_btn.configure(text="📂", state="normal", fg_color="#12121f", hover_color="#0b0b14", 
                                       command=self._on_open_click)
         elif text == "Cancelled":
             self.progress_bar.configure(progress_color=COLOR_ERROR)
-            self.action_btn.configure(state="disabled", fg_color="#12121f")
+            self.action_btn.configure(text="✕", state="disabled", fg_color="#12121f")
         elif text == "Error":
             self.progress_bar.configure(progress_color=COLOR_ERROR)
+            self.action_btn.configure(text="✕", state="normal", fg_color=COLOR_ERROR, hover_color="#A04040",
+                                      command=self._on_cancel_click)
+        else:
+            self.progress_bar.configure(progress_color=COLOR_ACCENT)
+            self.action_btn.configure(text="✕", state="normal", fg_color=COLOR_ERROR, hover_color="#A04040",
+                                      command=self._on_cancel_click)
 
     def update_title(self, text):
         if len(text) > 55: text = text[:52] + "..."
@@ -270,6 +203,212 @@ class DownloadItemFrame(ctk.CTkFrame):
     def set_path(self, path):
         self.download_path = path
 
+class VirtualDownloadList(ctk.CTkFrame):
+    """ Download list that only has widgets for the rows on screen.
+
+    Tasks live in TaskRecords; scrolling rebinds the same few DownloadItemFrames
+    to different records. Finished records past history_limit are dropped, oldest first.
+    """
+    def __init__(self, master, cancel_command, open_command, menu_command=None, history_limit=HISTORY_LIMIT,
+                 **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.cancel_command = cancel_command
+        self.open_command = open_command
+        self.menu_command = menu_command
+        self.history_limit = history_limit
+
+        self.records = []
+        self.by_id = {}
+        self.finished = collections.deque()  # task_ids in the order they finished
+        self.rows = []
+        self.top = 0
+        self.visible = 1
+
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.viewport.bind("<Configure>", self._on_resize)
+        # CTk widgets refuse bind_all, the window itself doesn't
+        window = self.winfo_toplevel()
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            window.bind_all(sequence, self._on_mousewheel, add="+")
+
+    # --- Records ---
+
+    def add(self, task_id, title, path):
+        if task_id in self.by_id:
+            return  # Already listed, e.g. our own task coming back from the daemon
+        record = TaskRecord(task_id, title, path)
+        self.records.append(record)
+        self.by_id[task_id] = record
+        if len(self.records) - 1 < self.top + self.visible:
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def update_record(self, task_id, update_type, value):
+        record = self.by_id.get(task_id)
+        if record is None: return
+        was_finished = record.finished
+
+        if update_type == "progress":
+            record.progress = value
+        elif update_type == "status":
+            record.status = value
+        elif update_type == "title":
+            record.title = value
+
+        row = self._row_for(record)
+        if row is not None:
+            if update_type == "progress":
+                row.update_progress(value)
+            elif update_type == "status":
+                row.update_status(value)
+            elif update_type == "title":
+                row.update_title(value)
+
+        if record.finished and not was_finished:
+            self.finished.append(task_id)
+            self._evict()
+
+    def swap(self, task_id, other_id):
+        """ Swap two records, as the scheduler swapped their queue places """
+        record, other = self.by_id.get(task_id), self.by_id.get(other_id)
+        if record is None or other is None: return
+        i, j = self.records.index(record), self.records.index(other)
+        self.records[i], self.records[j] = other, record
+        self._render()
+
+    def _evict(self):
+        evicted = False
+        while len(self.finished) > self.history_limit:
+            record = self.by_id.pop(self.finished.popleft(), None)
+            if record is not None:
+                self.records.remove(record)
+                evicted = True
+        if evicted:
+            self.top = min(self.top, max(0, len(self.records) - self.visible))
+            self._render()
+
+    # --- Rows ---
+
+    def _row_for(self, record):
+        for row in self.rows:
+            if row.task_id == record.task_id:
+                return row
+        return None
+
+    def _render(self):
+        shown = self.records[self.top:self.top + self.visible]
+        while len(self.rows) < len(shown):
+            row = DownloadItemFrame(self.viewport, cancel_command=self.cancel_command,
+                                    open_command=self.open_command, menu_command=self.menu_command)
+            self.rows.append(row)
+
+        for i, row in enumerate(self.rows):
+            if i < len(shown):
+                row.bind_record(shown[i])
+                if not row.winfo_ismapped():
+                    row.pack(fill="x", padx=0, pady=5)
+            else:
+                row.task_id = None
+                row.pack_forget()
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.records)
+        if total <= self.visible:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / total, (self.top + self.visible) / total)
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, len(self.records) - self.visible))
+        if top != self.top:
+            self.top = top
+            self._render()
+
+    # --- Events ---
+
+    def _on_resize(self, event):
+        visible = max(1, int(event.height // self._apply_widget_scaling(ROW_HEIGHT)))  # Scaling may return a float
+        if visible != self.visible:
+            self.visible = visible
+            self.top = min(self.top, max(0, len(self.records) - self.visible))
+            self._render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(round(float(amount) * len(self.records)))
+        elif action == "scroll":
+            step = self.visible if unit == "pages" else 1
+            self._scroll_to(self.top + int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        # bind_all fires for the whole window, only react over the list
+        if not str(event.widget).startswith(str(self)):
+            return
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self._scroll_to(self.top - 1)
+        else:
+            self._scroll_to(self.top + 1)
+
+def _format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+class StatsWindow(ctk.CTkToplevel):
+    """ Where the time went: totals, per-phase timings and the slowest recent downloads """
+    REFRESH_MS = 1000
+
+    def __init__(self, master, metrics):
+        super().__init__(master)
+        self.metrics = metrics
+        self.title("Download Stats")
+        self.geometry("640x480")
+        self.configure(fg_color=COLOR_BG)
+
+        self.text = ctk.CTkTextbox(self, font=("Consolas", 13), fg_color=COLOR_CARD, text_color=COLOR_TEXT,
+                                   corner_radius=20, border_width=0, wrap="none")
+        self.text.pack(fill="both", expand=True, padx=20, pady=20)
+        self._refresh()
+
+    def _refresh(self):
+        if not self.winfo_exists():
+            return
+        snap = self.metrics.snapshot()
+        lines = [
+            f"Active: {snap['active']}   " + "   ".join(f"{status}: {n}" for status, n in sorted(snap['finished'].items())),
+            f"Downloaded: {_format_bytes(snap['bytes'])}   Retries: {snap['retries']}   Fragments: {snap['fragments']}",
+            "",
+            f"{'Phase':<13}{'Count':>7}{'Avg':>9}{'p50':>9}{'p95':>9}",
+        ]
+        for phase in PHASES:
+            stats = snap['phases'][phase]
+            cells = [f"{stats[k]:.2f}s" if stats[k] is not None else "-" for k in ('avg', 'p50', 'p95')]
+            lines.append(f"{phase:<13}{stats['count']:>7}" + "".join(f"{c:>9}" for c in cells))
+
+        slowest = sorted((t for t in snap['tasks'] if 'total' in t['phases']),
+                         key=lambda t: t['phases']['total'], reverse=True)[:10]
+        if slowest:
+            lines += ["", "Slowest recent downloads:"]
+        for t in slowest:
+            # Biggest phase besides the total says where to look
+            phases = {k: v for k, v in t['phases'].items() if k != 'total'}
+            worst = max(phases, key=phases.get) if phases else "-"
+            speed = f"{_format_bytes(t['avg_speed'])}/s" if t['avg_speed'] else "-"
+            lines.append(f"{t['phases']['total']:>8.1f}s  {worst:<12}{speed:>12}  {t['url']}")
+
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", "\n".join(lines))
+        self.text.configure(state="disabled")
+        self.after(self.REFRESH_MS, self._refresh)
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -279,13 +418,34 @@ class App(ctk.CTk):
         self.configure(fg_color=COLOR_BG)
         
         # State
-        self.items = {}
-        self.manager = DownloadManager(self.update_item_callback)
+        self.update_bus = UpdateBus()
+        self.journal = TaskJournal(os.path.join(app_data_dir(), "journal.db"))
+        daemon = connect_daemon()
+        if daemon:
+            # ytfast_daemon.py is running: use its engine, shared with every other front-end
+            self.info_cache = self.archive = None
+            self.manager = RemoteManager(self.update_item_callback, daemon, journal=self.journal)
+        else:
+            self.info_cache = InfoCache(os.path.join(app_data_dir(), "info_cache.db"))
+            self.archive = DownloadArchive(os.path.join(app_data_dir(), "archive.db"))
+            # Optional: extraction in worker processes, keeps the Tk main loop responsive under load
+            extract_processes = int(os.environ.get("YTFAST_EXTRACT_PROCESSES") or 0)
+            self.manager = DownloadManager(self.update_item_callback, info_cache=self.info_cache,
+                                           journal=self.journal, archive=self.archive,
+                                           extract_pool=ExtractionPool(extract_processes) if extract_processes else None)
         self.current_mode = "Simple"
+        self.stats_window = None
+
+        # Optional Prometheus/JSON endpoint for the running app
+        metrics_port = os.environ.get("YTFAST_METRICS_PORT")
+        self.metrics_server = MetricsServer(self.manager.metrics, int(metrics_port)) if metrics_port else None
         
         # Path Init
         desired_path = "w:/Windows Components/Desktop"
-        if os.path.exists(desired_path):
+        saved_path = self.journal.get_setting("download_path")
+        if saved_path and os.path.exists(saved_path):
+            self.download_path = saved_path
+        elif os.path.exists(desired_path):
             self.download_path = desired_path
         else:
             self.download_path = os.path.join(os.path.expanduser("~"), "Desktop")
@@ -297,9 +457,40 @@ class App(ctk.CTk):
 
         # Keyboard Bindings
         self.bind("<Control-v>", self.on_paste)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        # Initial State
-        self.toggle_mode("Simple")
+        # Initial State (last session's choices, if any)
+        mode = self.journal.get_setting("mode", "Simple")
+        self.mode_switch.set(mode)
+        self.option_switch.set(self.journal.get_setting("option", "Quick Video"))
+        self.quality_combo.set(self.journal.get_setting("quality", "Best Available"))
+        speed = self.journal.get_setting("speed_limit", "No Limit")
+        self.speed_combo.set(speed if speed in SPEED_LIMITS else "No Limit")
+        priority = self.journal.get_setting("priority", "Normal")
+        self.priority_combo.set(priority if priority in PRIORITIES else "Normal")
+        if self.journal.get_setting("shortest_first", False):
+            self.sjf_switch.select()
+        if not daemon:
+            # A daemon keeps the limit and order it was started with, as for the CLI
+            self.manager.rate.set_rate_limit(SPEED_LIMITS[self.speed_combo.get()])
+            self.manager.set_shortest_first(bool(self.sjf_switch.get()))
+        self.toggle_mode(mode)
+
+        # Bring back whatever was queued or downloading when the app last closed
+        self.manager.restore()
+
+        # yt-dlp gets imported and a session built while the window comes up;
+        # anything added before that's done just waits in the queue
+        settings = self._task_settings()
+        self.manager.warm_up([(settings['mode'], settings['quality'])])
+        if os.environ.get("YTFAST_STARTUP_REPORT"):
+            self.after(0, self._report_startup)
+
+        # Start applying worker updates
+        self.after(UI_REFRESH_MS, self._drain_updates)
+        if os.environ.get("YTFAST_UI_STATS"):
+            self._ui_stats_last = (time.monotonic(), 0, 0)
+            self.after(5000, self._report_ui_stats)
 
     def _build_top_bar(self):
         top_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -308,6 +499,11 @@ class App(ctk.CTk):
         logo = ctk.CTkLabel(top_frame, text="⚡ Fast YT", font=APP_FONT_LARGE, text_color=COLOR_ACCENT)
         logo.pack(side="left")
 
+        self.stats_btn = ctk.CTkButton(top_frame, text="Stats", width=80, height=32, corner_radius=16,
+                                       fg_color=COLOR_CARD, hover_color="#0b0b14", font=APP_FONT,
+                                       command=self.show_stats)
+        self.stats_btn.pack(side="right", padx=(10, 0))
+
         # Mode Switch: Simple / Advanced
         self.mode_switch = ctk.CTkSegmentedButton(
             top_frame, 
@@ -348,6 +544,12 @@ class App(ctk.CTk):
                                        font=APP_FONT, command=self.manual_paste)
         self.paste_btn.pack(side="left", padx=(0, 10))
 
+        # Import a text file full of links
+        self.import_btn = ctk.CTkButton(row1, text="File", width=70, height=44, corner_radius=22,
+                                        fg_color="#12121f", hover_color="#0b0b14",
+                                        font=APP_FONT, command=self.import_file)
+        self.import_btn.pack(side="left", padx=(0, 10))
+
         # Download Button Pill
         self.action_btn = ctk.CTkButton(row1, text="Download", width=130, height=44, corner_radius=22,
                                         font=APP_FONT_BOLD, fg_color=COLOR_ACCENT, hover_color=COLOR_ACCENT_HOVER,
@@ -399,14 +601,36 @@ class App(ctk.CTk):
         self.quality_combo.set("Best Available")
         self.quality_combo.pack(side="left")
 
+        ctk.CTkLabel(self.adv_frame, text="Speed:", font=APP_FONT).pack(side="left", padx=(20,10))
+        self.speed_combo = ctk.CTkComboBox(self.adv_frame, values=list(SPEED_LIMITS), command=self.change_speed_limit,
+                                           width=130, height=32, corner_radius=16, font=APP_FONT,
+                                           fg_color=COLOR_INPUT_BG, border_width=0, button_color="#12121f")
+        self.speed_combo.set("No Limit")
+        self.speed_combo.pack(side="left")
+
+        ctk.CTkLabel(self.adv_frame, text="Priority:", font=APP_FONT).pack(side="left", padx=(20,10))
+        self.priority_combo = ctk.CTkComboBox(self.adv_frame, values=list(PRIORITIES), width=110, height=32,
+                                              corner_radius=16, font=APP_FONT, fg_color=COLOR_INPUT_BG,
+                                              border_width=0, button_color="#12121f")
+        self.priority_combo.set("Normal")
+        self.priority_combo.pack(side="left")
+
+        # Shortest-first: small downloads overtake big ones (big ones still get their turn)
+        self.sjf_switch = ctk.CTkSwitch(self.adv_frame, text="Shortest first", font=APP_FONT,
+                                        progress_color=COLOR_ACCENT, command=self.change_shortest_first)
+        self.sjf_switch.pack(side="left", padx=(20,0))
+
     def _build_list_area(self):
         # Queue Container Box
         self.queue_container = ctk.CTkFrame(self, fg_color=COLOR_CARD, corner_radius=20)
         self.queue_container.pack(fill="both", expand=True, padx=30, pady=(10, 30))
         
-        # Scrollable Area inside Container
-        self.scroll_frame = ctk.CTkScrollableFrame(self.queue_container, fg_color="transparent", label_text="")
-        self.scroll_frame.pack(fill="both", expand=True, padx=15, pady=15)
+        # Virtualized list inside Container
+        self.download_list = VirtualDownloadList(self.queue_container,
+                                                 cancel_command=self.manager.cancel_task,
+                                                 open_command=self.open_download_folder,
+                                                 menu_command=self.show_task_menu)
+        self.download_list.pack(fill="both", expand=True, padx=15, pady=15)
 
     # -------------------------------------------------------------------------
     # HELPERS
@@ -421,11 +645,69 @@ class App(ctk.CTk):
     # ACTIONS
     # -------------------------------------------------------------------------
 
+    def on_close(self):
+        self._save_settings()
+        self.manager.shutdown()
+        if self.metrics_server:
+            self.metrics_server.close()
+        if self.info_cache:
+            stats = self.info_cache.stats()
+            print(f"Info cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+            self.info_cache.close()
+            self.archive.close()
+        self.journal.close()
+        self.destroy()
+
+    def _save_settings(self):
+        self.journal.set_setting("download_path", self.download_path)
+        self.journal.set_setting("mode", self.current_mode)
+        self.journal.set_setting("option", self.option_switch.get())
+        self.journal.set_setting("quality", self.quality_combo.get())
+        self.journal.set_setting("speed_limit", self.speed_combo.get())
+        self.journal.set_setting("priority", self.priority_combo.get())
+        self.journal.set_setting("shortest_first", bool(self.sjf_switch.get()))
+
     def change_path(self):
         path = filedialog.askdirectory(initialdir=self.download_path)
         if path:
             self.download_path = path
             self.path_btn.configure(text=self._get_path_display_name(path))
+            self._save_settings()
+
+    def show_stats(self):
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.focus()
+        else:
+            self.stats_window = StatsWindow(self, self.manager.metrics)
+
+    def change_speed_limit(self, choice):
+        # Applies right away, to running downloads too
+        self.manager.rate.set_rate_limit(SPEED_LIMITS.get(choice))
+        self._save_settings()
+
+    def change_shortest_first(self):
+        self.manager.set_shortest_first(bool(self.sjf_switch.get()))
+        self._save_settings()
+
+    def show_task_menu(self, task_id, event):
+        # Only waiting tasks can be reordered, the manager says no to the rest
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="Pin to top", command=lambda: self.manager.pin_task(task_id))
+        menu.add_command(label="Unpin", command=lambda: self.manager.pin_task(task_id, pinned=False))
+        menu.add_separator()
+        menu.add_command(label="Move up", command=lambda: self.move_task(task_id, -1))
+        menu.add_command(label="Move down", command=lambda: self.move_task(task_id, 1))
+        menu.add_separator()
+        for name, lane in PRIORITIES.items():
+            menu.add_command(label=f"{name} priority",
+                             command=lambda lane=lane: self.manager.set_priority(task_id, lane))
+        menu.tk_popup(event.x_root, event.y_root)
+
+    def move_task(self, task_id, step):
+        # The scheduler swaps with the next waiting task in the same lane, not the next row
+        other = self.manager.move_task(task_id, step)
+        if other:
+            self.download_list.swap(task_id, other)
 
     def open_download_folder(self, path):
         try:
@@ -454,12 +736,17 @@ class App(ctk.CTk):
     def manual_paste(self):
         try:
             content = self.clipboard_get()
-            self.url_entry.delete(0, 'end')
-            self.url_entry.insert(0, content)
-            if self.current_mode == "Simple":
-                self.manual_add_from_entry()
         except:
-            pass
+            return
+        urls = parse_urls(content)
+        if len(urls) > 1:
+            # A list of links goes straight to the queue, the entry only holds one
+            self.start_download_tasks(urls)
+            return
+        self.url_entry.delete(0, 'end')
+        self.url_entry.insert(0, urls[0] if urls else content)
+        if self.current_mode == "Simple":
+            self.manual_add_from_entry()
 
     def on_paste(self, event):
         try:
@@ -467,28 +754,49 @@ class App(ctk.CTk):
         except:
             return
 
-        if self.current_mode == "Simple":
-            if self.validate_url(content):
-                self.start_download_task(content)
+        urls = parse_urls(content)
+        if self.current_mode == "Simple" or len(urls) > 1:
+            if urls:
+                self.start_download_tasks(urls)
                 self.url_entry.delete(0, 'end')
-                self.url_entry.insert(0, content) 
+                self.url_entry.insert(0, urls[0] if len(urls) == 1 else f"{len(urls)} links queued")
         else:
             if self.focus_get() != self.url_entry:
                 self.url_entry.delete(0, 'end')
                 self.url_entry.insert(0, content)
 
     def manual_add_from_entry(self):
-        url = self.url_entry.get().strip()
-        if self.validate_url(url):
-            self.start_download_task(url)
+        urls = parse_urls(self.url_entry.get())
+        if urls:
+            self.start_download_tasks(urls)
             self.url_entry.delete(0, 'end')
 
-    def validate_url(self, url):
-        return url and ("http" in url)
-
-    def start_download_task(self, url):
-        task_id = str(uuid.uuid4())
-        
+    def import_file(self):
+        path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                urls = parse_urls(f.read())
+        except OSError as e:
+            messagebox.showerror("Import", f"Could not read {path}: {e}")
+            return
+        if urls:
+            self.start_download_tasks(urls)
+        else:
+            messagebox.showinfo("Import", "No links found in that file.")
+
+    def start_download_tasks(self, urls):
+        # Same settings for the whole batch. Duplicates of something already in flight
+        # get their own row, which follows the task that's doing the work.
+        settings = self._task_settings()
+        self._save_settings()
+        for url in urls:
+            task_id = str(uuid.uuid4())
+            self.download_list.add(task_id, url, self.download_path)
+            self.manager.add_task(url, dict(settings), task_id)
+
+    def _task_settings(self):
         settings = {}
         settings['path'] = self.download_path
         
@@ -501,38 +809,58 @@ class App(ctk.CTk):
             settings['mode'] = 'video'
             q = self.quality_combo.get()
             settings['quality'] = q if q != "Best Available" else 'best'
-
-        # Create UI Item
-        item = DownloadItemFrame(
-            self.scroll_frame, 
-            task_id, 
-            url,
-            cancel_command=self.manager.cancel_task,
-            open_command=self.open_download_folder
-        )
-        item.set_path(self.download_path)
-        item.pack(fill="x", padx=0, pady=5)
-        self.items[task_id] = item
-
-        self.manager.add_task(url, settings, task_id)
+            settings['priority'] = PRIORITIES.get(self.priority_combo.get(), "normal")
+        return settings
 
     # -------------------------------------------------------------------------
     # CALLBACKS
     # -------------------------------------------------------------------------
     
     def update_item_callback(self, task_id, update_type, value):
-        self.after(0, lambda: self._apply_update(task_id, update_type, value))
+        # Called from worker threads, never touch Tk here
+        self.update_bus.post(task_id, update_type, value)
+
+    def _drain_updates(self):
+        for task_id, updates in self.update_bus.drain().items():
+            # Status last, so "Completed" lands after the final progress value
+            for update_type in ("added", "title", "progress", "status"):
+                if update_type in updates:
+                    self._apply_update(task_id, update_type, updates[update_type])
+        self.after(UI_REFRESH_MS, self._drain_updates)
+
+    def _report_ui_stats(self):
+        now = time.monotonic()
+        posted, drains = self.update_bus.counters()
+        last_time, last_posted, last_drains = self._ui_stats_last
+        elapsed = now - last_time
+        print(f"UI: {(posted - last_posted) / elapsed:.0f} updates/s "
+              f"(Tk callbacks/s with one after() each), "
+              f"{(drains - last_drains) / elapsed:.0f} Tk callbacks/s coalesced")
+        self._ui_stats_last = (now, posted, drains)
+        self.after(5000, self._report_ui_stats)
+
+    def _report_startup(self):
+        # Seconds since launch as JSON lines, read by bench/bench_startup.py
+        self.update_idletasks()
+        print(json.dumps({'event': "window", 'seconds': round(time.time() - _STARTED, 3)}), flush=True)
+        self._report_warm()
+
+    def _report_warm(self):
+        # Polled from the Tk loop, the warm-up thread never touches Tk
+        if not self.manager.warm.is_set():
+            self.after(UI_REFRESH_MS, self._report_warm)
+            return
+        print(json.dumps({'event': "warm", 'seconds': round(time.time() - _STARTED, 3)}), flush=True)
+        self.on_close()
 
     def _apply_update(self, task_id, update_type, value):
-        if task_id not in self.items: return
-        item = self.items[task_id]
-        if update_type == "progress":
-            item.update_progress(value)
-        elif update_type == "status":
-            item.update_status(value)
-        elif update_type == "title":
-            item.update_title(value)
+        if update_type == "added":
+            # Tasks the engine created itself, e.g. playlist entries
+            self.download_list.add(task_id, value['title'], value['path'])
+        else:
+            self.download_list.update_record(task_id, update_type, value)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Extraction processes in the packaged .exe
     app = App()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
@@ -0,0 +1,121 @@
+"""
+Fresh YoutubeDL per task vs. pooled DownloaderSessions, against a local HTTP server.
+
+Reports new TCP connections seen by the server and the per-task setup time
+(building or checking out the downloader). Run from the repo root:
+
+    python bench/bench_sessions.py --tasks 50
+"""
+import argparse
+import http.server
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from ytfast_core import SessionPool, build_ydl_opts
+
+PAYLOAD = os.urandom(256 * 1024)
+
+
+class CountingHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with CountingHandler.lock:
+            CountingHandler.connections += 1
+
+    def _headers(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        self._headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients dropping keep-alive connections on close
+
+
+def run_task(ydl, url):
+    info = ydl.extract_info(url, download=False, process=False)
+    ydl.process_ie_result(info, download=True)
+
+
+def bench(mode, base_url, tasks, out_dir):
+    profile = ('video', 'best')
+    pool = SessionPool()
+    CountingHandler.connections = 0
+    setup_time = 0.0
+    start = time.perf_counter()
+
+    for i in range(tasks):
+        url = f"{base_url}/clip{i}.mp4"
+        t = time.perf_counter()
+        if mode == "fresh":
+            opts = dict(build_ydl_opts(profile), paths={'home': out_dir}, noprogress=True)
+            ydl = yt_dlp.YoutubeDL(opts)
+            setup_time += time.perf_counter() - t
+            with ydl:
+                run_task(ydl, url)
+        else:
+            session = pool.acquire(profile)
+            session.ydl.params.update(paths={'home': out_dir}, noprogress=True)
+            setup_time += time.perf_counter() - t
+            try:
+                run_task(session.ydl, url)
+            finally:
+                pool.release(session)
+
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return {
+        'mode': mode,
+        'tasks': tasks,
+        'connections': CountingHandler.connections,
+        'setup_ms_per_task': round(setup_time / tasks * 1000, 3),
+        'total_s': round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=30)
+    args = parser.parse_args()
+
+    server = QuietServer(("127.0.0.1", 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    for mode in ("fresh", "pooled"):
+        out_dir = tempfile.mkdtemp(prefix="ytfast-bench-")
+        try:
+            print(bench(mode, base_url, args.tasks, out_dir))
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
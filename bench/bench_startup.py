@@ -0,0 +1,151 @@
+"""
+Cold start: how long until the window is up, and until the first download is done.
+
+Every sample is a fresh Python process, so imports are measured cold (OS file cache aside).
+
+    python bench/bench_startup.py --runs 5 -o startup.json
+
+Workloads:
+    gui      YTFast.py with YTFAST_STARTUP_REPORT=1: launch -> window drawn (window_s),
+             -> yt-dlp imported and a session warmed (warm_s). Needs a display, skipped without one.
+    engine   headless, against bench/fakemedia.py: launch -> engine ready to take URLs (ready_s),
+             -> first byte (first_byte_s) and first download completed (first_download_s)
+             of a URL submitted right after the engine was ready.
+
+Times are medians over --runs, in seconds since the process was started.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+
+def run_child(cmd, env=None, timeout=120):
+    """ Seconds from launch to each {"event": ...} line the child prints """
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, cwd=ROOT, env=env)
+    killer = threading.Timer(timeout, proc.kill)  # A hung child ends the sample, not the bench
+    killer.start()
+    times = {}
+    try:
+        for line in proc.stdout:
+            try:
+                event = json.loads(line)['event']
+            except (ValueError, KeyError, TypeError):
+                continue
+            times[event] = time.perf_counter() - start
+    finally:
+        killer.cancel()
+        proc.kill()
+        proc.wait()
+    return times
+
+
+def engine_child(url, out_dir):
+    """ Runs in the child process: bring the engine up and download one URL """
+    sys.path.insert(0, ROOT)
+    from ytfast_core import DownloadManager, PostProcessStage, SessionPool, FINISHED_STATUSES
+
+    def emit(event):
+        print(json.dumps({'event': event}), flush=True)
+
+    done = []
+    def callback(task_id, update_type, value):
+        if update_type != "status":
+            return
+        if value.startswith("Downloading") and "first_byte" not in done:
+            done.append("first_byte")
+            emit("first_byte")
+        elif value in FINISHED_STATUSES:
+            done.append(value)
+            emit("first_download" if value == "Completed" else "failed")
+
+    sessions = SessionPool()
+    manager = DownloadManager(callback, sessions=sessions, postprocess=PostProcessStage(use_ffmpeg=False))
+    emit("ready")
+
+    from fakemedia import FakeMediaIE  # Imports yt-dlp, so only after "ready"
+    sessions.extractors = (FakeMediaIE,)
+    manager.warm_up()
+    manager.add_task(url, {'mode': 'video', 'quality': 'best', 'path': out_dir}, "startup")
+    while not any(d != "first_byte" for d in done):
+        time.sleep(0.01)
+    manager.shutdown()
+
+
+def has_display():
+    return platform.system() in ("Windows", "Darwin") or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def median(samples, key):
+    values = [s[key] for s in samples if key in s]
+    return round(statistics.median(values), 3) if values else None
+
+
+def bench_gui(args):
+    if not has_display():
+        return {'workload': 'gui', 'skipped': "no display"}
+    env = dict(os.environ, YTFAST_STARTUP_REPORT="1")
+    samples = [run_child([sys.executable, os.path.join(ROOT, "YTFast.py")], env=env) for _ in range(args.runs)]
+    return {'workload': 'gui', 'runs': args.runs, 'window_s': median(samples, 'window'), 'warm_s': median(samples, 'warm')}
+
+
+def bench_engine(args):
+    from fakemedia import FakeMediaServer
+
+    server = FakeMediaServer().start()
+    samples = []
+    for i in range(args.runs):
+        out_dir = tempfile.mkdtemp(prefix="ytfast-bench-startup-")
+        url = f"{server.base_url}/watch/progressive/startup{i}?size={args.size}"
+        samples.append(run_child([sys.executable, os.path.abspath(__file__), "--child", url, out_dir]))
+        shutil.rmtree(out_dir, ignore_errors=True)
+    server.shutdown()
+    return {'workload': 'engine', 'runs': args.runs, 'ready_s': median(samples, 'ready'),
+            'first_byte_s': median(samples, 'first_byte'), 'first_download_s': median(samples, 'first_download'),
+            'failed': sum('failed' in s for s in samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="Comma-separated workloads (default: gui,engine)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per workload")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="Bytes of the first download")
+    parser.add_argument("-o", "--output", help="Also write the JSON lines to this file")
+    parser.add_argument("--child", nargs=2, metavar=("URL", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        engine_child(*args.child)
+        return
+
+    benches = {'gui': bench_gui, 'engine': bench_engine}
+    names = args.only.split(",") if args.only else list(benches)
+    unknown = set(names) - set(benches)
+    if unknown:
+        parser.error(f"unknown workload(s): {', '.join(sorted(unknown))}")
+
+    lines = [{'bench': 'startup', 'python': platform.python_version(), 'runs': args.runs}]
+    print(json.dumps(lines[0]), flush=True)
+    for name in names:
+        result = benches[name](args)
+        lines.append(result)
+        print(json.dumps(result), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Offline benchmark suite: scripted workloads through DownloadManager against the
+local fake media site in bench/fakemedia.py (no internet, no ffmpeg, no display).
+
+    python bench/bench_suite.py                          # everything, JSON lines on stdout
+    python bench/bench_suite.py -o before.json
+    python bench/bench_suite.py -o after.json --compare before.json
+    python bench/bench_suite.py --only small,cancel --scale 0.2
+
+Workloads:
+    large      one big progressive file
+    small      many small progressive files
+    dash       DASH videos (fragmented)
+    hls        HLS videos (fragmented)
+    playlist   one playlist, expanded into one task per entry
+    cancel     throttled downloads, each cancelled as soon as its first byte arrives
+
+The first line describes the run (commit, versions, settings), then one line per workload:
+
+    wall_s, tasks, completed, cancelled, errors, bytes (served), requests (served),
+    throughput_mbps   MB/s over the whole workload
+    ttfb_ms           worker picks the task up -> first progress from the download (p50/p95)
+    overhead_ms       task time not spent transferring: extraction, setup, finishing (p50/p95)
+    ui_updates_per_s  engine callbacks (what the UI would receive)
+    ui_refreshes_per_s  UpdateBus drains that had something to apply, at --ui-refresh-ms
+    cancel_ms         cancel_task() -> "Cancelled" (cancel workload only, p50/p95)
+    extractions       extractor runs (DownloadManager.extract_count), and extractions_per_task:
+                      should stay at one per task, a warning goes to stderr if it's higher
+
+--compare prints before/after/change per metric to stderr.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from fakemedia import FakeMediaHandler, FakeMediaIE, FakeMediaServer
+from ytfast_core import (DownloadManager, ExtractionPool, PostProcessStage, SessionPool, UpdateBus, FINISHED_STATUSES,
+                         MAX_WORKERS)
+
+MB = 1024 * 1024
+
+# name -> how to build it. Counts and sizes are multiplied by --scale (counts stay >= 1).
+WORKLOADS = {
+    'large':    {'kind': 'progressive', 'count': 1, 'query': {'size': 256 * MB}},
+    'small':    {'kind': 'progressive', 'count': 500, 'query': {'size': 64 * 1024}},
+    'dash':     {'kind': 'dash', 'count': 20, 'query': {'segments': 40, 'segment_size': 128 * 1024}},
+    'hls':      {'kind': 'hls', 'count': 20, 'query': {'segments': 40, 'segment_size': 128 * 1024}},
+    'playlist': {'kind': 'playlist', 'count': 1, 'query': {'entries': 300, 'size': 64 * 1024}},
+    'cancel':   {'kind': 'progressive', 'count': 30, 'query': {'size': 64 * MB}, 'rate': MB, 'cancel': True},
+}
+SCALED = ('size', 'entries')  # Query values that follow --scale; segments stay fixed
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None}
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+    return {'p50': pick(0.5), 'p95': pick(0.95)}
+
+
+class Recorder:
+    """ Engine update callback that timestamps each task's life, and cancels on first byte if asked """
+    def __init__(self, bus, cancel_on_first_byte=False):
+        self.bus = bus
+        self.cancel_on_first_byte = cancel_on_first_byte
+        self.manager = None
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.updates = 0
+
+    def callback(self, task_id, update_type, value):
+        now = time.perf_counter()
+        first_byte = False
+        with self.lock:
+            self.updates += 1
+            task = self.tasks.setdefault(task_id, {})
+            if update_type == "status":
+                if value == "Initializing...":
+                    task.setdefault('start', now)
+                elif value.startswith("Downloading"):
+                    first_byte = 'first_byte' not in task
+                    task.setdefault('first_byte', now)
+                    task['last_byte'] = now
+                elif value in FINISHED_STATUSES:
+                    task['end'] = now
+                    task['status'] = value
+        self.bus.post(task_id, update_type, value)
+
+        if first_byte and self.cancel_on_first_byte:
+            with self.lock:
+                task['cancel'] = time.perf_counter()
+            self.manager.cancel_task(task_id)
+
+    def done(self):
+        with self.lock:
+            return all('end' in task for task in self.tasks.values())
+
+
+def build_urls(base_url, spec, scale):
+    query = {k: max(1, int(v * scale)) if k in SCALED else v for k, v in spec['query'].items()}
+    query_str = "&".join(f"{k}={v}" for k, v in query.items())
+    count = max(1, int(spec['count'] * scale)) if spec['kind'] != 'playlist' else spec['count']
+    return [f"{base_url}/watch/{spec['kind']}/{spec['kind']}{i}?{query_str}" for i in range(count)]
+
+
+def run_workload(name, spec, server, args):
+    server.reset_stats()
+    FakeMediaHandler.rate = spec.get('rate')
+    out_dir = tempfile.mkdtemp(prefix=f"ytfast-bench-{name}-")
+
+    bus = UpdateBus()
+    recorder = Recorder(bus, cancel_on_first_byte=spec.get('cancel', False))
+    manager = DownloadManager(recorder.callback, max_workers=args.workers, per_host_limit=args.workers,
+                              sessions=SessionPool(extractors=(FakeMediaIE,)),
+                              postprocess=PostProcessStage(use_ffmpeg=False),
+                              extract_pool=ExtractionPool(args.extract_processes, extractors=(FakeMediaIE,))
+                              if args.extract_processes else None)
+    recorder.manager = manager
+
+    # Stand-in for the GUI's refresh loop
+    refreshes = 0
+    stop = threading.Event()
+    def ui_loop():
+        nonlocal refreshes
+        while not stop.wait(args.ui_refresh_ms / 1000):
+            if bus.drain():
+                refreshes += 1
+    ui_thread = threading.Thread(target=ui_loop, name="bench-ui", daemon=True)
+    ui_thread.start()
+
+    settings = {'mode': 'video', 'quality': 'best', 'path': out_dir}
+    start = time.perf_counter()
+    for i, url in enumerate(build_urls(server.base_url, spec, args.scale)):
+        task_id = f"{name}-{i}"
+        recorder.callback(task_id, "added", {'title': url, 'path': out_dir, 'url': url})
+        manager.add_task(url, dict(settings), task_id)
+
+    deadline = start + args.timeout
+    while (manager.busy() or not recorder.done()) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    wall = time.perf_counter() - start
+    timed_out = manager.busy() or not recorder.done()
+
+    stop.set()
+    ui_thread.join()
+    manager.shutdown()
+    for worker in manager.workers:
+        worker.join(timeout=5)
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+    tasks = list(recorder.tasks.values())
+    served = server.stats()
+    statuses = [t.get('status') for t in tasks]
+    ttfb = [t['first_byte'] - t['start'] for t in tasks if 'first_byte' in t and 'start' in t]
+    overhead = [(t['end'] - t['start']) - (t.get('last_byte', t['start']) - t.get('first_byte', t['start']))
+                for t in tasks if 'end' in t and 'start' in t and t.get('status') == "Completed"]
+
+    result = {
+        'workload': name,
+        'tasks': len(tasks),
+        'completed': statuses.count("Completed"),
+        'cancelled': statuses.count("Cancelled"),
+        'errors': statuses.count("Error"),
+        'timed_out': timed_out,
+        'wall_s': round(wall, 3),
+        'bytes': served['bytes_sent'],
+        'requests': served['requests'],
+        'throughput_mbps': round(served['bytes_sent'] / MB / wall, 2),
+        'ttfb_ms': percentiles(ttfb),
+        'overhead_ms': percentiles(overhead),
+        'ui_updates_per_s': round(recorder.updates / wall, 1),
+        'ui_refreshes_per_s': round(refreshes / wall, 1),
+        'extractions': manager.extract_count,
+        'extractions_per_task': round(manager.extract_count / len(tasks), 2) if tasks else None,
+    }
+    if spec.get('cancel'):
+        result['cancel_ms'] = percentiles([t['end'] - t['cancel'] for t in tasks if 'cancel' in t and 'end' in t])
+    return result
+
+
+def run_info(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'bench': 'suite',
+        'commit': commit,
+        'python': platform.python_version(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'workers': args.workers,
+        'extract_processes': args.extract_processes,
+        'scale': args.scale,
+        'latency_ms': args.latency_ms,
+        'ui_refresh_ms': args.ui_refresh_ms,
+    }
+
+
+def flatten(result, prefix=""):
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(baseline_path, results):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r['workload']: r for r in map(json.loads, f) if 'workload' in r}
+
+    out = sys.stderr
+    out.write(f"{'workload':<10} {'metric':<22} {'before':>12} {'after':>12} {'change':>8}\n")
+    for result in results:
+        before = flatten(baseline.get(result['workload'], {}))
+        for metric, value in flatten(result).items():
+            old = before.get(metric)
+            if old is None:
+                continue
+            change = f"{(value - old) / old * 100:+.1f}%" if old else ""
+            out.write(f"{result['workload']:<10} {metric:<22} {old:>12} {value:>12} {change:>8}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help=f"Comma-separated workloads (default: all of {', '.join(WORKLOADS)})")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply task counts and file sizes")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--extract-processes", type=int, default=0, help="Extract in this many processes (0 = in-thread)")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Server delay before every response")
+    parser.add_argument("--ui-refresh-ms", type=float, default=40.0, help="Simulated UI drain interval")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Give up on a workload after this long")
+    parser.add_argument("-o", "--output", help="Also write the JSON lines to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON lines from an earlier run to compare with")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(WORKLOADS)
+    unknown = set(names) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workload(s): {', '.join(sorted(unknown))}")
+
+    server = FakeMediaServer().start()
+    FakeMediaHandler.latency = args.latency_ms / 1000
+
+    lines = [run_info(args)]
+    print(json.dumps(lines[0]), flush=True)
+    results = []
+    for name in names:
+        result = run_workload(name, WORKLOADS[name], server, args)
+        results.append(result)
+        lines.append(result)
+        print(json.dumps(result), flush=True)
+        if result['extractions'] > result['tasks']:
+            print(f"warning: {name}: {result['extractions']} extractions for {result['tasks']} tasks", file=sys.stderr)
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
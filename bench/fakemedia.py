@@ -0,0 +1,262 @@
+"""
+Local fake media site for benchmarks: synthetic progressive, DASH and HLS media
+plus a yt-dlp extractor for it, so the whole engine runs without the internet.
+
+Watch URLs (what gets queued):
+
+    {base}/watch/progressive/<id>?size=BYTES
+    {base}/watch/dash/<id>?segments=N&segment_size=BYTES
+    {base}/watch/hls/<id>?segments=N&segment_size=BYTES
+    {base}/watch/playlist/<id>?entries=N&size=BYTES
+
+The extractor fetches {base}/api/... once per video (like a real site's page or
+API call) and gets the format URLs from there. Media bytes are random, not real
+video, so benchmarks must keep ffmpeg out (PostProcessStage(use_ffmpeg=False)).
+
+Server knobs (class attributes of FakeMediaHandler):
+    latency     seconds slept before every response (time-to-first-byte)
+    rate        bytes/sec per response, None = as fast as possible
+    faults      scripted failures for the next media responses, each used once, in order:
+                "reset" drops the connection halfway through, "403" refuses the request,
+                None lets that one through.
+                Range probes (bytes=0-0) are never faulted.
+
+Every media response is logged in FakeMediaServer.ranges() as (path, start, bytes sent),
+so tests can tell a resumed download from a restarted one.
+"""
+import http.server
+import json
+import os
+import re
+import socket
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from yt_dlp.extractor.common import InfoExtractor
+
+BLOCK = os.urandom(1024 * 1024)  # Media is this block repeated
+CHUNK = 64 * 1024
+
+
+def media_bytes(size):
+    """ The content the server sends for a media file of this size """
+    return (BLOCK * (size // len(BLOCK) + 1))[:size]
+
+
+class FakeMediaHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like real CDNs
+    latency = 0.0
+    rate = None
+    faults = []
+
+    # Counters, reset by FakeMediaServer.reset_stats()
+    lock = threading.Lock()
+    requests = 0
+    bytes_sent = 0
+    served = []  # [path, start, bytes sent] per media response
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET(body=False)
+
+    def do_GET(self, body=True):
+        with FakeMediaHandler.lock:
+            FakeMediaHandler.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+
+        if parts[0] == "api" and len(parts) == 3:
+            return self._send_bytes(json.dumps(self._api(parts[1], parts[2], query)).encode(),
+                                    "application/json", body)
+        if parts[0] == "dash" and parts[-1] == "manifest.mpd":
+            return self._send_bytes(self._mpd(query).encode(), "application/dash+xml", body)
+        if parts[0] == "hls" and parts[-1] == "master.m3u8":
+            return self._send_bytes(self._master_m3u8(query).encode(), "application/vnd.apple.mpegurl", body)
+        if parts[0] == "hls" and parts[-1] == "media.m3u8":
+            return self._send_bytes(self._media_m3u8(query).encode(), "application/vnd.apple.mpegurl", body)
+        if parts[0] == "media":
+            # Progressive files and DASH/HLS segments alike: size comes from the query
+            return self._send_media(url.path, int(query.get("size", CHUNK)), body)
+        self.send_error(404)
+
+    # --- Pages -----------------------------------------------------------------
+
+    def _base(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def _api(self, kind, video_id, query):
+        base = self._base()
+        info = {'id': video_id, 'title': f"Fake {kind} {video_id}", 'kind': kind}
+        if kind == "progressive":
+            info['url'] = f"{base}/media/{video_id}.mp4?size={query.get('size', 1024 * 1024)}"
+        elif kind in ("dash", "hls"):
+            manifest = "manifest.mpd" if kind == "dash" else "master.m3u8"
+            info['manifest'] = f"{base}/{kind}/{video_id}/{manifest}?{urlencode(query)}"
+        elif kind == "playlist":
+            entry_query = urlencode({'size': query.get('size', 256 * 1024)})
+            info['entries'] = [f"{base}/watch/progressive/{video_id}-{i}?{entry_query}"
+                               for i in range(int(query.get('entries', 10)))]
+        return info
+
+    def _mpd(self, query):
+        segments = int(query.get("segments", 10))
+        size = int(query.get("segment_size", 256 * 1024))
+        # One muxed representation, so there's a single stream and nothing to merge
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{segments * 2}S"
+     minBufferTime="PT2S" profiles="urn:mpeg:dash:profile:isoff-live:2011">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" segmentAlignment="true">
+      <Representation id="muxed" bandwidth="{size * 4}" width="1280" height="720" codecs="avc1.64001f,mp4a.40.2">
+        <SegmentTemplate timescale="1" duration="2" startNumber="1"
+                         initialization="/media/init.mp4?size=1024" media="/media/seg-$Number$.m4s?size={size}"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+    def _master_m3u8(self, query):
+        return ("#EXTM3U\n"
+                '#EXT-X-STREAM-INF:BANDWIDTH=1000000,RESOLUTION=1280x720,CODECS="avc1.64001f,mp4a.40.2"\n'
+                f"media.m3u8?{urlencode(query)}\n")
+
+    def _media_m3u8(self, query):
+        segments = int(query.get("segments", 10))
+        size = int(query.get("segment_size", 256 * 1024))
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for i in range(segments):
+            lines += ["#EXTINF:2.0,", f"/media/seg{i}.ts?size={size}"]
+        lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    # --- Responses -------------------------------------------------------------
+
+    def _send_bytes(self, data, content_type, body):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+            self._count(len(data))
+
+    def _send_media(self, path, size, body):
+        start, end = 0, size - 1
+        fault = None
+        if self.headers.get("Range") != "bytes=0-0":
+            with FakeMediaHandler.lock:
+                fault = FakeMediaHandler.faults.pop(0) if FakeMediaHandler.faults else None
+        if fault == "403":
+            self.send_error(403)
+            return
+        m = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if m:
+            start, end = int(m.group(1)), min(int(m.group(2) or end), size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not body:
+            return
+
+        # Logged before the bytes go out, so a client that has them can already see the entry
+        served = [path, start, 0]
+        with FakeMediaHandler.lock:
+            FakeMediaHandler.served.append(served)
+        pos = start
+        stop = start + (end - start + 1) // 2 if fault == "reset" else end + 1
+        try:
+            while pos < stop:
+                offset = pos % len(BLOCK)
+                n = min(CHUNK, stop - pos, len(BLOCK) - offset)
+                with FakeMediaHandler.lock:
+                    served[2] += n
+                self.wfile.write(BLOCK[offset:offset + n])
+                self._count(n)
+                pos += n
+                if self.rate:
+                    time.sleep(n / self.rate)
+            if fault == "reset":
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+                self.close_connection = True
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client cancelled
+
+    def _count(self, n):
+        with FakeMediaHandler.lock:
+            FakeMediaHandler.bytes_sent += n
+
+
+class FakeMediaServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), FakeMediaHandler)
+        self.base_url = f"http://{host}:{self.server_port}"
+
+    def handle_error(self, request, client_address):
+        pass  # Clients dropping keep-alive connections
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fakemedia", daemon=True).start()
+        return self
+
+    def reset_stats(self):
+        with FakeMediaHandler.lock:
+            FakeMediaHandler.requests = 0
+            FakeMediaHandler.bytes_sent = 0
+            FakeMediaHandler.served = []
+
+    def stats(self):
+        with FakeMediaHandler.lock:
+            return {'requests': FakeMediaHandler.requests, 'bytes_sent': FakeMediaHandler.bytes_sent}
+
+    def ranges(self, path=None):
+        """ (path, start, bytes sent) of the media responses so far, optionally for one path """
+        with FakeMediaHandler.lock:
+            return [tuple(r) for r in FakeMediaHandler.served if path is None or r[0] == path]
+
+
+class FakeMediaIE(InfoExtractor):
+    IE_NAME = "fakemedia"
+    _VALID_URL = r"https?://(?:127\.0\.0\.1|localhost)(?::\d+)?/watch/(?P<kind>progressive|dash|hls|playlist)/(?P<id>[\w-]+)"
+
+    def _real_extract(self, url):
+        kind, video_id = self._match_valid_url(url).group("kind", "id")
+        parsed = urlparse(url)
+        api = self._download_json(f"{parsed.scheme}://{parsed.netloc}/api/{kind}/{video_id}?{parsed.query}",
+                                  video_id, note=False)
+
+        if kind == "playlist":
+            return self.playlist_result(
+                [self.url_result(entry, FakeMediaIE) for entry in api['entries']],
+                video_id, api['title'])
+
+        if kind == "dash":
+            formats = self._extract_mpd_formats(api['manifest'], video_id, note=False)
+        elif kind == "hls":
+            formats = self._extract_m3u8_formats(api['manifest'], video_id, "mp4", m3u8_id="hls", note=False)
+        else:
+            formats = [{'url': api['url'], 'format_id': "progressive", 'ext': "mp4",
+                        'vcodec': "avc1.64001f", 'acodec': "mp4a.40.2", 'width': 1280, 'height': 720}]
+
+        return {'id': video_id, 'title': api['title'], 'formats': formats}
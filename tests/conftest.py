@@ -0,0 +1,76 @@
+"""
+Shared fixtures: the engine against bench/fakemedia.py's local site, no internet, no ffmpeg.
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+from ytfast_core import FINISHED_STATUSES
+
+
+class Recorder:
+    """ Engine update callback that keeps each task's latest status, so tests can wait for the finish """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.status = {}
+        self.history = {}
+
+    def __call__(self, task_id, update_type, value):
+        if update_type != "status":
+            return
+        with self.cond:
+            self.status[task_id] = value
+            self.history.setdefault(task_id, []).append(value)
+            self.cond.notify_all()
+
+    def wait(self, task_ids, timeout=60):
+        """ Final status per task id, fails the test if they don't all finish in time """
+        with self.cond:
+            done = self.cond.wait_for(lambda: all(self.status.get(i) in FINISHED_STATUSES for i in task_ids),
+                                      timeout)
+            assert done, f"Not finished after {timeout}s: {self.status}"
+            return {i: self.status[i] for i in task_ids}
+
+
+@pytest.fixture
+def media_server():
+    pytest.importorskip("yt_dlp")
+    from fakemedia import FakeMediaHandler, FakeMediaServer
+    server = FakeMediaServer().start()
+    server.reset_stats()  # The counters live on the handler class, shared by every server
+    yield server
+    FakeMediaHandler.faults = []
+    FakeMediaHandler.rate = None
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def engine(media_server, tmp_path):
+    """ make(**kwargs) -> (manager, recorder): a DownloadManager wired to the fake site """
+    from fakemedia import FakeMediaIE
+    from ytfast_core import DownloadManager, PostProcessStage, SessionPool
+    managers = []
+
+    def make(**kwargs):
+        recorder = Recorder()
+        manager = DownloadManager(recorder, sessions=SessionPool(extractors=(FakeMediaIE,)),
+                                  postprocess=PostProcessStage(use_ffmpeg=False), **kwargs)
+        managers.append(manager)
+        return manager, recorder
+
+    yield make
+    for manager in managers:
+        manager.shutdown()
+        for worker in manager.workers:
+            worker.join(timeout=5)
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return {'mode': 'video', 'quality': 'best', 'path': str(tmp_path)}
@@ -0,0 +1,44 @@
+"""
+Transient failures retry and resume: completed bytes are kept, and only an expired
+stream URL (403) sends the task back to the extractor.
+"""
+import glob
+import os
+
+import pytest
+
+import ytfast_core
+
+KB = 1024
+SIZE = 2048 * KB
+
+
+# Faults go to media requests in order: the four segments start together, one is cut off,
+# and in the second case the retry of that segment is refused as expired
+@pytest.mark.parametrize("faults, extractions", [(["reset"], 1), (["reset", None, None, None, "403"], 2)])
+def test_transient_failures_resume(engine, media_server, settings, tmp_path, monkeypatch, faults, extractions):
+    from fakemedia import FakeMediaHandler, media_bytes
+    monkeypatch.setattr(ytfast_core, "SEGMENT_MIN_SIZE", 256 * KB)
+    monkeypatch.setattr(ytfast_core, "RETRY_DELAY", 0.1)
+    # Slow enough that the segments have bytes on disk when a fault hits
+    FakeMediaHandler.rate = 512 * KB
+    FakeMediaHandler.faults = list(faults)
+
+    manager, recorder = engine()
+    url = f"{media_server.base_url}/watch/progressive/flaky?size={SIZE}"
+    task_id = manager.add_task(url, dict(settings), "flaky")
+
+    assert recorder.wait([task_id]) == {task_id: "Completed"}
+    assert manager.metrics.snapshot()['retries'] >= len([f for f in faults if f])
+    assert manager.extract_count == extractions
+    assert any(status.startswith("Retrying") for status in recorder.history[task_id]) == ("403" in faults)
+
+    # Resumed, not restarted: offset 0 is only ever asked for once (besides the bytes=0-0 range probes)
+    fetched = [(start, sent) for _, start, sent in media_server.ranges("/media/flaky.mp4") if sent > 1]
+    assert [start for start, _ in fetched].count(0) == 1
+    assert sum(sent for _, sent in fetched) < 1.5 * SIZE
+
+    outputs = glob.glob(os.path.join(str(tmp_path), "*.mp4"))
+    assert len(outputs) == 1
+    with open(outputs[0], "rb") as f:
+        assert f.read() == media_bytes(SIZE)
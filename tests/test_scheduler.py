@@ -0,0 +1,134 @@
+"""
+TaskScheduler order: pins, lanes, shortest-first, move, and the aging/starvation fairness,
+on a fake clock so hours of queueing take no time.
+"""
+import threading
+
+from ytfast_core import AGING_SECONDS, SJF_DEFAULT_SIZE, STARVATION_SECONDS, TaskScheduler
+
+MB = 1024 * 1024
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_task(task_id, priority="normal", size=None, host="example.com"):
+    return {'id': task_id, 'host': host, 'priority': priority, 'pinned': None, 'size': size,
+            'cancel': threading.Event()}
+
+
+def order(scheduler):
+    return [task['id'] for task in scheduler.ordered()]
+
+
+def drain(scheduler):
+    handed_out = []
+    while True:
+        task = scheduler.get(timeout=0)
+        if task is None:
+            return handed_out
+        scheduler.release(task['host'])
+        handed_out.append(task['id'])
+
+
+def test_lanes_then_queue_order():
+    scheduler = TaskScheduler(clock=Clock())
+    for task_id, lane in [("a", "low"), ("b", "normal"), ("c", "high"), ("d", "normal"), ("e", "high")]:
+        scheduler.put(make_task(task_id, lane))
+
+    assert order(scheduler) == ["c", "e", "b", "d", "a"]
+    assert drain(scheduler) == ["c", "e", "b", "d", "a"]
+
+
+def test_latest_pin_goes_first_and_unpin_restores_place():
+    scheduler = TaskScheduler(clock=Clock())
+    for task_id, lane in [("a", "high"), ("b", "normal"), ("c", "low")]:
+        scheduler.put(make_task(task_id, lane))
+
+    assert scheduler.pin("c")
+    assert scheduler.pin("b")
+    assert order(scheduler) == ["b", "c", "a"]
+
+    assert scheduler.pin("b", pinned=False)
+    assert order(scheduler) == ["c", "a", "b"]
+    assert not scheduler.pin("missing")
+
+
+def test_move_swaps_with_the_same_lane_neighbour_only():
+    scheduler = TaskScheduler(clock=Clock())
+    for task_id, lane in [("n1", "normal"), ("h1", "high"), ("n2", "normal"), ("n3", "normal")]:
+        scheduler.put(make_task(task_id, lane))
+
+    # The row above n3 in the list may be anything, the scheduler swaps with n2
+    assert scheduler.move("n3", -1) == "n2"
+    assert order(scheduler) == ["h1", "n1", "n3", "n2"]
+    assert scheduler.move("n1", 1) == "n3"
+    assert order(scheduler) == ["h1", "n3", "n1", "n2"]
+
+    # Lane edges don't cross into another lane
+    assert scheduler.move("n3", -1) is None
+    assert scheduler.move("h1", 1) is None
+    assert order(scheduler) == ["h1", "n3", "n1", "n2"]
+
+
+def test_shortest_first_inside_a_lane():
+    scheduler = TaskScheduler(sjf=True, clock=Clock())
+    scheduler.put(make_task("big", size=900 * MB))
+    scheduler.put(make_task("unknown"))
+    scheduler.put(make_task("small", size=1 * MB))
+    scheduler.put(make_task("low-tiny", "low", size=1))
+
+    # Unknown sizes count as SJF_DEFAULT_SIZE; size never beats the lane
+    assert SJF_DEFAULT_SIZE < 900 * MB
+    assert order(scheduler) == ["small", "unknown", "big", "low-tiny"]
+
+
+def test_waiting_ages_a_task_up_the_lanes():
+    clock = Clock()
+    scheduler = TaskScheduler(clock=clock)
+    scheduler.put(make_task("old-low", "low"))
+    clock.now += 2 * AGING_SECONDS
+    scheduler.put(make_task("new-high", "high"))
+
+    assert order(scheduler) == ["old-low", "new-high"]
+
+
+def test_large_job_is_not_starved_by_a_stream_of_small_ones():
+    clock = Clock()
+    scheduler = TaskScheduler(per_host_limit=1, sjf=True, clock=clock)
+    scheduler.put(make_task("huge", "low", size=100_000 * MB))
+
+    # Two small high-priority jobs arrive for each one served, so the queue never runs dry
+    served_at = None
+    for i in range(10_000):
+        scheduler.put(make_task(f"small-{i}-a", "high", size=1 * MB))
+        scheduler.put(make_task(f"small-{i}-b", "high", size=1 * MB))
+        task = scheduler.get(timeout=0)
+        scheduler.release(task['host'])
+        if task['id'] == "huge":
+            served_at = clock.now
+            break
+        clock.now += 10
+
+    assert served_at is not None and served_at <= STARVATION_SECONDS
+
+
+def test_host_cap_and_claims():
+    scheduler = TaskScheduler(per_host_limit=1, clock=Clock())
+    a1, a2, b1 = make_task("a1", host="a"), make_task("a2", host="a"), make_task("b1", host="b")
+    for task in (a1, a2, b1):
+        scheduler.put(task)
+
+    assert scheduler.claim(a1)  # Being probed: holds host a's only slot
+    assert scheduler.get(timeout=0)['id'] == "b1"
+    assert scheduler.get(timeout=0) is None
+    scheduler.unclaim(a1)
+    assert scheduler.get(timeout=0)['id'] == "a1"
+    assert scheduler.get(timeout=0) is None  # a2 waits for a1's slot
+    scheduler.release("a")
+    assert scheduler.get(timeout=0)['id'] == "a2"
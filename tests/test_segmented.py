@@ -0,0 +1,57 @@
+"""
+SegmentedDownload: a download cut off mid-segment resumes from its .part.segments state,
+without asking the server again for bytes it already has.
+"""
+import json
+import os
+import threading
+
+import pytest
+
+import ytfast_core
+
+KB = 1024
+
+
+@pytest.fixture
+def ydl():
+    from ytfast_core import DownloaderSession, build_ydl_opts
+    session = DownloaderSession(('video', 'best'), build_ydl_opts(('video', 'best')))
+    yield session.ydl
+    session.close()
+
+
+def test_resume_fetches_only_missing_ranges(media_server, ydl, tmp_path, monkeypatch):
+    from fakemedia import FakeMediaHandler, media_bytes
+    monkeypatch.setattr(ytfast_core, "SEGMENT_MIN_SIZE", 256 * KB)
+    monkeypatch.setattr(ytfast_core, "SEGMENT_RETRIES", 0)
+    size = 2048 * KB
+    fmt = {'url': f"{media_server.base_url}/media/big.mp4?size={size}", 'format_id': "progressive"}
+    path = str(tmp_path / "big.mp4")
+
+    # First attempt: the server drops one connection halfway through its segment, the rest stop with it
+    FakeMediaHandler.rate = 1024 * KB
+    FakeMediaHandler.faults = ["reset"]
+    with pytest.raises(Exception):
+        ytfast_core.SegmentedDownload(ydl, fmt, path, 4, threading.Event()).run()
+
+    with open(path + ".part.segments", encoding="utf-8") as f:
+        segments = json.load(f)['segments']
+    received = [(start, start + done) for start, _, done in segments if done]
+    assert any(0 < done < end - start + 1 for start, end, done in segments)  # Cut off mid-segment
+    have = sum(end - start for start, end in received)
+    assert 0 < have < size
+
+    # Second attempt, as after a restart: a new object working from the saved state
+    FakeMediaHandler.rate = None
+    media_server.reset_stats()
+    assert ytfast_core.SegmentedDownload(ydl, fmt, path, 4, threading.Event()).run()
+
+    fetched = [(start, start + sent) for _, start, sent in media_server.ranges("/media/big.mp4") if sent > 1]
+    for start, end in fetched:
+        for have_start, have_end in received:
+            assert end <= have_start or start >= have_end, f"{start}-{end} fetched again"
+    assert sum(end - start for start, end in fetched) == size - have
+    assert not os.path.exists(path + ".part.segments")
+    with open(path, "rb") as f:
+        assert f.read() == media_bytes(size)
@@ -0,0 +1,42 @@
+"""
+One extractor run per task: the download works from the info the extraction produced,
+and a retry reuses it unless the stream URLs expired.
+"""
+import pytest
+
+import ytfast_core
+
+KB = 1024
+
+
+def watch_urls(base_url, kind, count, query):
+    return [f"{base_url}/watch/{kind}/{kind}{i}?{query}" for i in range(count)]
+
+
+def test_one_extraction_per_task(engine, media_server, settings):
+    manager, recorder = engine()
+    urls = (watch_urls(media_server.base_url, "progressive", 4, f"size={64 * KB}")
+            + watch_urls(media_server.base_url, "dash", 3, f"segments=4&segment_size={16 * KB}")
+            + watch_urls(media_server.base_url, "hls", 3, f"segments=4&segment_size={16 * KB}"))
+    task_ids = [manager.add_task(url, dict(settings), f"task-{i}") for i, url in enumerate(urls)]
+
+    assert set(recorder.wait(task_ids).values()) == {"Completed"}
+    assert manager.extract_count == len(urls)
+
+
+@pytest.mark.parametrize("fault, extractions", [("reset", 1), ("403", 2)])
+def test_retry_extracts_again_only_when_expired(engine, media_server, settings, monkeypatch, fault, extractions):
+    from fakemedia import FakeMediaHandler
+    # Small segments, and no retrying inside the segment: the fault fails the task, which retries
+    monkeypatch.setattr(ytfast_core, "SEGMENT_MIN_SIZE", 256 * KB)
+    monkeypatch.setattr(ytfast_core, "SEGMENT_RETRIES", 0)
+    monkeypatch.setattr(ytfast_core, "RETRY_DELAY", 0.1)
+    FakeMediaHandler.faults = [fault]
+
+    manager, recorder = engine()
+    url = f"{media_server.base_url}/watch/progressive/retried?size={2048 * KB}"
+    task_id = manager.add_task(url, dict(settings), "retried")
+
+    assert recorder.wait([task_id]) == {task_id: "Completed"}
+    assert any(status.startswith("Retrying") for status in recorder.history[task_id])
+    assert manager.extract_count == extractions
@@ -0,0 +1,73 @@
+"""
+Pasted text -> canonical URLs, one dedupe key per video, and duplicates following the task in flight.
+"""
+import pytest
+
+from ytfast_core import canonical_url, dedupe_key, parse_urls
+
+VIDEO = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    f"https://www.youtube.com/watch?v={VIDEO}",
+    f"https://youtube.com/watch?v={VIDEO}&t=42s",
+    f"https://m.youtube.com/watch?feature=share&v={VIDEO}",
+    f"https://youtu.be/{VIDEO}",
+    f"https://youtu.be/{VIDEO}?si=abc123",
+    f"https://www.youtube.com/shorts/{VIDEO}",
+    f"https://www.youtube.com/embed/{VIDEO}",
+    f"https://music.youtube.com/watch?v={VIDEO}",
+])
+def test_video_spellings_share_one_key(url):
+    assert dedupe_key(url) == f"Youtube:{VIDEO}"
+    assert canonical_url(url) == f"https://www.youtube.com/watch?v={VIDEO}"
+
+
+def test_playlists_stay_distinct():
+    keys = {dedupe_key(url) for url in [
+        "https://www.youtube.com/playlist?list=PLaaaa",
+        "https://www.youtube.com/playlist?list=PLbbbb",
+        f"https://www.youtube.com/watch?v={VIDEO}&list=PLaaaa",
+        f"https://www.youtube.com/watch?v={VIDEO}",
+    ]}
+    assert len(keys) == 4
+    assert canonical_url("https://youtube.com/watch?list=PLaaaa") == "https://www.youtube.com/playlist?list=PLaaaa"
+
+
+@pytest.mark.parametrize("text, urls", [
+    # Sentence punctuation goes
+    ("get https://example.com/a.", ["https://example.com/a"]),
+    ("https://example.com/a, https://example.com/b; https://example.com/c!?",
+     ["https://example.com/a", "https://example.com/b", "https://example.com/c"]),
+    # Unbalanced closing brackets belong to the text around the URL
+    ("(see https://example.com/a)", ["https://example.com/a"]),
+    ("[https://example.com/a]", ["https://example.com/a"]),
+    ("(https://example.com/a).", ["https://example.com/a"]),
+    # Balanced ones are part of the URL
+    ("https://example.com/a_(b)", ["https://example.com/a_(b)"]),
+    ("(https://en.wikipedia.org/wiki/Foo_(bar))", ["https://en.wikipedia.org/wiki/Foo_(bar)"]),
+    ("https://example.com/a_(b)).", ["https://example.com/a_(b)"]),
+    ("https://example.com/q?x=[1]", ["https://example.com/q?x=[1]"]),
+    # Quotes and angle brackets end a URL
+    ('"https://example.com/a" <https://example.com/b>', ["https://example.com/a", "https://example.com/b"]),
+    # Every spelling of one video once, in order
+    (f"https://youtu.be/{VIDEO}\nhttps://www.youtube.com/shorts/{VIDEO} https://example.com/x",
+     [f"https://www.youtube.com/watch?v={VIDEO}", "https://example.com/x"]),
+    ("no links here", []),
+])
+def test_parse_urls(text, urls):
+    assert parse_urls(text) == urls
+
+
+def test_duplicate_follows_the_task_in_flight(engine, media_server, settings):
+    from fakemedia import FakeMediaHandler
+    FakeMediaHandler.rate = 512 * 1024  # Slow enough that the first is still downloading
+    manager, recorder = engine()
+    url = f"{media_server.base_url}/watch/progressive/dup?size={256 * 1024}"
+
+    assert manager.add_task(url, dict(settings), "first") == "first"
+    assert manager.add_task(url + "#again", dict(settings), "second") == "first"
+
+    assert recorder.wait(["first", "second"]) == {"first": "Completed", "second": "Completed"}
+    assert "Already queued, following it" in recorder.history["second"]
+    assert manager.extract_count == 1
@@ -0,0 +1,218 @@
+"""
+Headless YTFast: runs URLs through the same engine as the GUI, no Tk or display needed.
+
+    python ytfast_cli.py urls.txt -o ~/Videos
+    some-script | python ytfast_cli.py --audio
+
+URLs are read line by line (blank lines and # comments are skipped, a line may hold
+several links, YouTube links are normalized to watch?v=ID) and queued as they arrive,
+so a slow producer on stdin works fine. A video that is already queued or downloading
+isn't fetched twice: the duplicate follows the first task and ends with its status.
+Progress and results go to stdout as JSON lines:
+
+    {"event": "queued", "id": ..., "url": ..., "title": ...}
+    {"event": "update", "id": ..., "status": ..., "progress": ..., "title": ...}
+    {"event": "done", "id": ..., "url": ..., "status": ..., "title": ..., "timing": {...}}
+    {"event": "summary", "total": N, "completed": N, "skipped": N, "cancelled": N, "errors": N, "elapsed": s,
+     "hosts": {host: {"fragments": N, "delay": s, "throughput": bytes/s, "throttled": N}}}
+
+"done" status is one of FINISHED_STATUSES: Completed, Cancelled, Error or Already downloaded.
+"timing" has the seconds each phase took, as far as the task got:
+{"queue": s, "extract": s, "download": s, "pp_wait": s, "postprocess": s, "total": s}.
+
+--connect sends the URLs to a running ytfast_daemon.py instead; the output then also
+covers the daemon's other tasks, and the run ends when the daemon's queue is empty.
+
+--metrics FILE keeps a metrics file up to date (Prometheus text for .prom/.txt, JSON
+otherwise); --metrics-port PORT serves /metrics and /metrics.json on localhost.
+
+Exit code is 1 if any task ended in "Error".
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from ytfast_core import (DownloadManager, DownloadArchive, ExtractionPool, InfoCache, MetricsServer, RemoteManager,
+                         UpdateBus, EXTRACT_PROCESSES, FINISHED_STATUSES, MAX_WORKERS, PER_HOST_LIMIT, PRIORITY_LANES,
+                         app_data_dir, connect_daemon, parse_urls)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch downloader, JSON-lines output.")
+    parser.add_argument("input", nargs="?", default="-", help="File with one URL per line, - for stdin (default)")
+    parser.add_argument("-o", "--output", default=os.getcwd(), help="Download folder (default: current dir)")
+    parser.add_argument("--audio", action="store_true", help="Audio only (m4a), same as the GUI's 'Audio Only'")
+    parser.add_argument("--quality", default="best", choices=["best", "2160", "1440", "1080", "720"],
+                        help="Max video height (default: best)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Parallel downloads")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_LIMIT, help="Parallel downloads per site")
+    parser.add_argument("--limit-rate", type=parse_rate, default=None, metavar="RATE",
+                        help="Total download speed cap across all downloads, e.g. 500K or 4M (bytes/s)")
+    parser.add_argument("--priority", default="normal", choices=list(PRIORITY_LANES),
+                        help="Queue lane for these URLs (default: normal)")
+    parser.add_argument("--shortest-first", action="store_true",
+                        help="Start the smallest downloads first (sizes come from extraction ahead of time)")
+    parser.add_argument("--extract-processes", type=int, default=EXTRACT_PROCESSES, metavar="N",
+                        help="Run extraction in N worker processes (uses more cores; default: 0, in-process)")
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the on-disk info cache")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="Download even if the download archive says we already have it")
+    parser.add_argument("--connect", action="store_true",
+                        help="Submit to the running ytfast_daemon.py instead of starting an engine here")
+    parser.add_argument("--metrics", metavar="FILE", help="Write metrics here (.prom/.txt: Prometheus text, else JSON)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="Serve /metrics and /metrics.json on localhost")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between progress batches")
+    return parser.parse_args(argv)
+
+
+def parse_rate(text):
+    """ "500K", "4M", "1.5MiB/s" or plain bytes -> bytes/sec """
+    m = re.fullmatch(r'([\d.]+)\s*([KMG]?)(?:I?B)?(?:/S)?', text.strip().upper())
+    if not m:
+        raise argparse.ArgumentTypeError(f"invalid rate: {text!r}")
+    return int(float(m.group(1)) * 1024 ** " KMG".index(m.group(2) or " "))
+
+
+def read_urls(stream):
+    # Any number of links per line, canonical; the engine drops duplicates still in flight
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield from parse_urls(line)
+
+
+def emit(event, **fields):
+    sys.stdout.write(json.dumps({'event': event, **fields}) + "\n")
+    sys.stdout.flush()
+
+
+class BatchRunner:
+    def __init__(self, args):
+        self.args = args
+        self.bus = UpdateBus()
+        if args.connect:
+            # The daemon's own settings win, unless given here explicitly
+            self.info_cache = self.archive = None
+            self.manager = RemoteManager(self.bus.post, args.connect)
+            if args.limit_rate is not None:
+                self.manager.rate.set_rate_limit(args.limit_rate)
+            if args.shortest_first:
+                self.manager.set_shortest_first(True)
+        else:
+            self.info_cache = None if args.no_cache else InfoCache(os.path.join(app_data_dir(), "info_cache.db"))
+            self.archive = None if args.no_archive else DownloadArchive(os.path.join(app_data_dir(), "archive.db"))
+            self.manager = DownloadManager(self.bus.post, max_workers=args.workers,
+                                           per_host_limit=args.per_host, info_cache=self.info_cache,
+                                           archive=self.archive, sjf=args.shortest_first,
+                                           extract_pool=ExtractionPool(args.extract_processes) if args.extract_processes else None)
+            self.manager.rate.set_rate_limit(args.limit_rate)
+        self.metrics_server = MetricsServer(self.manager.metrics, args.metrics_port) if args.metrics_port else None
+        self.metrics_written = 0.0
+        self.settings = {
+            'mode': 'audio' if args.audio else 'video',
+            'quality': 'best' if args.audio else args.quality,
+            'path': os.path.abspath(args.output),
+            'priority': args.priority,
+        }
+
+        self.tasks = {}      # task_id -> {'url', 'title'}
+        self.pending = set()
+        self.results = {}    # status -> count
+        self.input_done = threading.Event()
+
+    def _feed(self, stream):
+        try:
+            for url in read_urls(stream):
+                task_id = str(uuid.uuid4())
+                # Goes through the bus like engine-created tasks, so the main loop sees it first
+                self.bus.post(task_id, "added", {'title': url, 'path': self.settings['path'], 'url': url})
+                self.manager.add_task(url, dict(self.settings), task_id)
+        finally:
+            self.input_done.set()
+
+    def _apply(self, batch):
+        for task_id, updates in batch.items():
+            if "added" in updates and task_id not in self.tasks:
+                added = updates["added"]
+                self.tasks[task_id] = {'url': added.get('url'), 'title': added['title']}
+                self.pending.add(task_id)
+                emit("queued", id=task_id, url=added.get('url'), title=added['title'])
+
+            task = self.tasks.setdefault(task_id, {'url': None, 'title': None})
+            if "title" in updates:
+                task['title'] = updates["title"]
+            if "timing" in updates:
+                task['timing'] = updates["timing"]
+
+            status = updates.get("status")
+            if status in FINISHED_STATUSES:
+                if task_id in self.pending:
+                    self.pending.discard(task_id)
+                    self.results[status] = self.results.get(status, 0) + 1
+                    emit("done", id=task_id, url=task['url'], status=status, title=task['title'],
+                         timing=task.get('timing'))
+            elif set(updates) - {"added", "timing"}:
+                emit("update", id=task_id, status=status, progress=updates.get("progress"),
+                     title=updates.get("title"))
+
+    def _write_metrics(self, force=False):
+        # Every few seconds is plenty for a file someone tails or scrapes
+        if self.args.metrics and (force or time.monotonic() - self.metrics_written >= 5):
+            self.manager.metrics.write(self.args.metrics)
+            self.metrics_written = time.monotonic()
+
+    def run(self, stream):
+        start = time.monotonic()
+        threading.Thread(target=self._feed, args=(stream,), name="ytfast-input", daemon=True).start()
+
+        try:
+            while True:
+                time.sleep(self.args.interval)
+                # Snapshot before draining, so nothing posted after the check gets lost
+                input_done = self.input_done.is_set()
+                self._apply(self.bus.drain())
+                self._write_metrics()
+                if input_done and not self.pending and not self.manager.busy():
+                    break
+        except KeyboardInterrupt:
+            self.manager.shutdown()
+            return 130
+        finally:
+            self._write_metrics(force=True)
+            if self.metrics_server:
+                self.metrics_server.close()
+            if self.info_cache:
+                self.info_cache.close()
+            if self.archive:
+                self.archive.close()
+
+        self.manager.shutdown()
+        emit("summary", total=len(self.tasks), completed=self.results.get("Completed", 0),
+             skipped=self.results.get("Already downloaded", 0), cancelled=self.results.get("Cancelled", 0),
+             errors=self.results.get("Error", 0), elapsed=round(time.monotonic() - start, 3),
+             hosts=self.manager.rate.snapshot())
+        return 1 if self.results.get("Error") else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    if args.connect:
+        args.connect = connect_daemon()
+        if args.connect is None:
+            print("No YTFast daemon running (start ytfast_daemon.py)", file=sys.stderr)
+            return 2
+
+    if args.input == "-":
+        return BatchRunner(args).run(sys.stdin)
+    with open(args.input, encoding="utf-8") as stream:
+        return BatchRunner(args).run(stream)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
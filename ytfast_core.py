@@ -0,0 +1,2222 @@
+"""
+Download engine behind the YTFast GUI and the headless CLI.
+
+Nothing in here imports tkinter/customtkinter, and yt_dlp (hundreds of extractor
+modules) is only imported when first needed, see DownloadManager.warm_up().
+"""
+import threading
+import collections
+import time
+import uuid
+import sys
+import os
+import platform
+import sqlite3
+import json
+import zlib
+import re
+import functools
+import secrets
+import urllib.request
+import copy
+import itertools
+import http.server
+import shutil
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlparse
+
+# -----------------------------------------------------------------------------
+# HELPER: APP DATA
+# -----------------------------------------------------------------------------
+def app_data_dir():
+    """ Per-user folder for caches and app state, created on first use """
+    if platform.system() == "Windows":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    elif platform.system() == "Darwin":
+        base = os.path.join(os.path.expanduser("~"), "Library", "Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+
+    path = os.path.join(base, "YTFast")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# -----------------------------------------------------------------------------
+# CONFIGURATION
+# -----------------------------------------------------------------------------
+
+# Download engine
+MAX_WORKERS = 3      # Parallel downloads
+PER_HOST_LIMIT = 2   # Max parallel downloads hitting the same site (keeps YouTube happy)
+
+# Statuses a task can end in
+FINISHED_STATUSES = ("Completed", "Cancelled", "Error", "Already downloaded")
+
+# Info cache: googlevideo stream URLs stay valid for ~6h, keep a safety margin
+INFO_CACHE_TTL = 5 * 3600
+INFO_CACHE_MAX_ENTRIES = 2000
+
+# Playlists: stop listing entries while this many tasks are already waiting
+EXPAND_MAX_PENDING = 100
+
+# Extraction in worker processes (0 = on the download threads, the default)
+EXTRACT_PROCESSES = 0
+# Info dict fields the download never looks at, not worth pickling across processes
+COMPACT_DROP_KEYS = ('automatic_captions', 'subtitles', 'heatmap', 'thumbnails', 'comments', 'description')
+
+# Post-processing: ffmpeg jobs run next to the downloads, this many at a time
+PP_WORKERS = 2
+
+# Codecs that can be stream-copied into the output container instead of re-encoded
+MP4_VIDEO_CODECS = ('avc1', 'h264', 'hev1', 'hvc1', 'h265', 'av01', 'vp09', 'vp9')
+MP4_AUDIO_CODECS = ('mp4a', 'aac', 'opus', 'mp3', 'ac-3', 'ec-3', 'alac', 'flac')
+M4A_AUDIO_CODECS = ('mp4a', 'aac', 'alac')
+
+# Adaptive rate control: fragment concurrency per host moves between these (AIMD)
+FRAGMENTS_START = 4
+FRAGMENTS_MIN = 1
+FRAGMENTS_MAX = 16
+PACING_MAX_DELAY = 60        # Seconds between task starts on a host that keeps throttling us
+RATE_MIN_SAMPLE = 1024 * 1024  # Downloads smaller than this say nothing about throughput
+THROTTLE_RE = re.compile(r'HTTP Error 429|Too Many Requests|rate.?limit', re.IGNORECASE)
+
+# Segmented downloads: progressive files split into HTTP Range segments, one connection each.
+# How many connections comes from RateController.fragments(), like DASH/HLS fragments.
+SEGMENT_MIN_SIZE = 8 * 1024 * 1024    # No segment smaller than this (small files stay single-connection)
+SEGMENT_READ_SIZE = 256 * 1024
+SEGMENT_RETRIES = 5                   # Per segment, in a row, before the download fails
+SEGMENT_STATE_EVERY = 8 * 1024 * 1024  # Save resume state after this many new bytes
+
+# Retries: transient failures re-queue the task (keeping what's downloaded) instead of ending it
+TASK_RETRIES = 5
+RETRY_DELAY = 5         # Seconds before the first retry, doubling each time
+RETRY_MAX_DELAY = 300
+TRANSIENT_RE = re.compile(
+    r"timed? ?out|Connection (?:reset|refused|aborted)|closed before|IncompleteRead|Remote end closed"
+    r"|Temporary failure|urlopen error|HTTP Error (?:403|408|410|429|5\d\d)|Range request|Download failed"
+    r"|giving up after|Errno (?:104|110|111|113)", re.IGNORECASE)
+EXPIRED_RE = re.compile(r"HTTP Error (?:403|410)|Forbidden|\bGone\b|expired", re.IGNORECASE)
+
+# Scheduling: lanes in priority order, and fairness so big/low jobs still get their turn
+PRIORITY_LANES = ("high", "normal", "low")
+AGING_SECONDS = 300         # Each this long in the queue: one lane up, size counts half as much again
+STARVATION_SECONDS = 1800   # Waited this long: goes next, whatever its lane or size
+SIZE_PROBE_AHEAD = 10       # Shortest-first: extract this many waiting tasks ahead to learn their size
+SJF_DEFAULT_SIZE = 100 * 1024 * 1024  # Size assumed while unknown
+# Rough bytes/sec per quality, to size playlist entries from their duration
+BITRATE_ESTIMATES = {'audio': 16_000, '720': 350_000, '1080': 700_000, '1440': 1_500_000,
+                     '2160': 3_000_000, 'best': 1_500_000}
+
+# Metrics: finished tasks kept for the JSON export and the quantiles
+METRICS_HISTORY = 1000
+
+# Daemon: finished tasks remote clients can still see, and how long a progress poll may wait
+DAEMON_HISTORY = 500
+DAEMON_POLL_TIMEOUT = 20
+
+# Hosts that share one concurrency bucket
+HOST_GROUPS = {
+    'youtube.com': 'youtube',
+    'youtu.be': 'youtube',
+    'googlevideo.com': 'youtube',
+}
+
+# -----------------------------------------------------------------------------
+# LOGIC & WORKER
+# -----------------------------------------------------------------------------
+
+def host_key(url):
+    """ Map a URL to the bucket used for per-host concurrency limits """
+    host = (urlparse(url).hostname or "").lower()
+    for domain, group in HOST_GROUPS.items():
+        if host == domain or host.endswith("." + domain):
+            return group
+    return host or "unknown"
+
+@functools.lru_cache(maxsize=1)
+def _extractor_classes():
+    import yt_dlp
+    # Generic matches any URL, so it can't give us a stable video id
+    return [ie for ie in yt_dlp.extractor.gen_extractor_classes() if ie.ie_key() != "Generic"]
+
+@functools.lru_cache(maxsize=4096)
+def video_key(url):
+    """ 'Extractor:video_id' for a URL without touching the network, or None """
+    for ie in _extractor_classes():
+        if ie.suitable(url):
+            video_id = ie.get_temp_id(url)
+            return f"{ie.ie_key()}:{video_id}" if video_id else None
+    return None
+
+URL_RE = re.compile(r"https?://[^\s<>\"'`]+", re.IGNORECASE)
+YOUTUBE_VIDEO_RE = re.compile(
+    r"^https?://(?:(?:www|m|music)\.)?(?:youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|embed/|live/|v/)"
+    r"|youtu\.be/)([\w-]{11})(?![\w-])", re.IGNORECASE)
+YOUTUBE_LIST_RE = re.compile(r"^https?://(?:(?:www|m|music)\.)?youtube\.com/[^#]*[?&]list=([\w-]+)", re.IGNORECASE)
+YOUTUBE_TAB_RE = re.compile(r"^https?://(?:(?:www|m|music)\.)?youtube\.com/(?:playlist\?|channel/|c/|user/|@)", re.IGNORECASE)
+
+def canonical_url(url):
+    """ One spelling per YouTube video (watch?v=, youtu.be, shorts, embed...), other URLs as given """
+    video = YOUTUBE_VIDEO_RE.match(url)
+    playlist = YOUTUBE_LIST_RE.match(url)
+    if video and not playlist:
+        return f"https://www.youtube.com/watch?v={video.group(1)}"
+    if playlist and not video:
+        return f"https://www.youtube.com/playlist?list={playlist.group(1)}"
+    return url  # watch?v=...&list=... stays as is, yt-dlp decides what that means
+
+def is_playlist_url(url):
+    """ True for URLs that are surely playlists or channels, without yt-dlp or the network """
+    return bool(YOUTUBE_TAB_RE.match(url) or (YOUTUBE_LIST_RE.match(url) and not YOUTUBE_VIDEO_RE.match(url)))
+
+def dedupe_key(url):
+    """ Same key for every spelling of the same video, without yt-dlp or the network """
+    video = YOUTUBE_VIDEO_RE.match(url)
+    if video and not YOUTUBE_LIST_RE.match(url):
+        return f"Youtube:{video.group(1)}"  # Same as video_key()
+    return url.split('#')[0]
+
+def strip_trailing(url):
+    """ Drop punctuation that ends the sentence around a URL. A closing bracket only goes
+    if it has no partner in the URL, so https://en.wikipedia.org/wiki/Foo_(bar) survives. """
+    while url:
+        last = url[-1]
+        if last in '.,;:!?':
+            url = url[:-1]
+        elif last in ')]}' and url.count(last) > url.count('([{'[')]}'.index(last)]):
+            url = url[:-1]
+        else:
+            return url
+    return url
+
+def parse_urls(text):
+    """ Every http(s) URL in a blob of text (one per line, space separated, mixed with prose...),
+    canonical and in order, each video once """
+    urls = []
+    seen = set()
+    for match in URL_RE.finditer(text):
+        url = canonical_url(strip_trailing(match.group(0)))
+        key = dedupe_key(url)
+        if key not in seen:
+            seen.add(key)
+            urls.append(url)
+    return urls
+
+def info_key(info):
+    """ Same key as video_key(), built from an extracted info dict """
+    if info.get('extractor_key') and info.get('id'):
+        return f"{info['extractor_key']}:{info['id']}"
+    return None
+
+EXPIRE_RE = re.compile(r"[?&/]expire[=/](\d+)")
+
+def stream_expiry(info):
+    """ Earliest expiry timestamp found in the format URLs, or None """
+    stamps = []
+    for f in info.get('formats') or [info]:
+        for field in ('url', 'manifest_url'):
+            m = EXPIRE_RE.search(f.get(field) or "")
+            if m:
+                stamps.append(int(m.group(1)))
+    return min(stamps) if stamps else None
+
+def iter_playlist_entries(info, page_size=50):
+    """ Walk playlist entries lazily, without keeping the ones already seen around """
+    from yt_dlp.utils import PagedList
+    entries = info.get('entries') or []
+    if isinstance(entries, PagedList):
+        start = 0
+        while True:
+            page = entries.getslice(start, start + page_size)
+            if not page:
+                return
+            yield from page
+            start += len(page)
+    else:
+        yield from entries
+
+def archive_key(video, settings):
+    """ Archive key: the same video in another mode/quality is a different download """
+    if not video:
+        return None
+    return f"{video}|{settings.get('mode', 'video')}:{settings.get('quality', 'best')}"
+
+class AlreadyDownloaded(Exception):
+    pass
+
+class DownloadArchive:
+    """ Videos we already downloaded, per mode/quality profile.
+
+    The whole index lives in a dict (loaded once from SQLite), so a lookup is a
+    hash probe plus a stat of the recorded file. Deleted files count as not downloaded.
+    """
+    def __init__(self, db_path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS archive (key TEXT PRIMARY KEY, filepath TEXT, added REAL)")
+        self.index = dict(self.db.execute("SELECT key, filepath FROM archive"))
+
+    def __contains__(self, key):
+        if key not in self.index:
+            return False
+        filepath = self.index[key]
+        if filepath and not os.path.exists(filepath):
+            self.remove(key)
+            return False
+        return True
+
+    def add(self, key, filepath=None):
+        with self.lock:
+            self.index[key] = filepath
+            self.db.execute("INSERT OR REPLACE INTO archive VALUES (?, ?, ?)", (key, filepath, time.time()))
+
+    def remove(self, key):
+        with self.lock:
+            self.index.pop(key, None)
+            self.db.execute("DELETE FROM archive WHERE key = ?", (key,))
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+class InfoCache:
+    """ On-disk cache of extracted info dicts, keyed by video_key() """
+    def __init__(self, db_path, ttl=INFO_CACHE_TTL, max_entries=INFO_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS info (
+            key TEXT PRIMARY KEY, expires REAL, accessed REAL, data BLOB)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS info_accessed ON info(accessed)")
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT data, expires FROM info WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                if row is not None:
+                    self.db.execute("DELETE FROM info WHERE key = ?", (key,))
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE info SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, info):
+        now = time.time()
+        expires = now + self.ttl
+        stream_expires = stream_expiry(info)
+        if stream_expires:
+            expires = min(expires, stream_expires - 15 * 60)
+        if expires <= now:
+            return
+
+        data = zlib.compress(json.dumps(info).encode())
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO info VALUES (?, ?, ?, ?)", (key, expires, now, data))
+            # LRU eviction past the size cap
+            self.db.execute("""DELETE FROM info WHERE key IN (
+                SELECT key FROM info ORDER BY accessed DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def invalidate(self, key):
+        with self.lock:
+            self.db.execute("DELETE FROM info WHERE key = ?", (key,))
+
+    def stats(self):
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM info").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+def _retry_sleep(n):
+    # Between yt-dlp's own request/fragment retries. Module level: ydl opts get pickled for ExtractionPool.
+    return min(30, 2 ** n)
+
+def build_ydl_opts(profile):
+    """ yt-dlp options for a (mode, quality) profile """
+    mode, quality = profile
+
+    ydl_opts = {
+        'outtmpl': '%(title)s.%(ext)s',
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,  # Progress goes through our hooks, keep stdout clean
+        'continuedl': True,  # Resume .part files, e.g. after a restart
+        'http_headers': {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'},
+        'concurrent_fragment_downloads': FRAGMENTS_START,  # Adjusted per task by RateController
+        'retries': 10,
+        'fragment_retries': 10,
+        'retry_sleep_functions': {'http': _retry_sleep, 'fragment': _retry_sleep},
+        # A fragment that never arrives fails the attempt (and the task retries, resuming)
+        # instead of leaving a hole in the file
+        'skip_unavailable_fragments': False,
+    }
+
+    # No yt-dlp postprocessors: merging/converting is PostProcessStage's job
+    if mode == 'audio':
+        ydl_opts.update({
+            # AAC first, so the m4a can usually be a stream copy instead of a transcode
+            'format': 'bestaudio[acodec^=mp4a]/bestaudio/best',
+            'writethumbnail': False,
+        })
+    else:
+        if quality != 'best':
+            fmt = f"bestvideo[height<={quality}][vcodec^=avc]+bestaudio[acodec^=mp4a]/bestvideo[height<={quality}]+bestaudio/best[height<={quality}]"
+        else:
+            fmt = "bestvideo[vcodec^=avc]+bestaudio[acodec^=mp4a]/bestvideo+bestaudio/best"
+        
+        ydl_opts.update({
+            'format': fmt,
+            'merge_output_format': 'mp4',
+        })
+
+    return ydl_opts
+
+def _codec_in(codec, family):
+    return bool(codec) and codec != 'none' and codec.lower().split('.')[0] in family
+
+def build_pp_command(ffmpeg, job):
+    """ ffmpeg arguments for a post-processing job, stream copy wherever the codecs allow.
+
+    Returns None when no ffmpeg run is needed at all (one stream already in the right container).
+    """
+    inputs = job['inputs']
+    if job['mode'] == 'audio':
+        copy_audio = all(_codec_in(f['acodec'], M4A_AUDIO_CODECS) for f in inputs)
+        copy_video = True
+    else:
+        copy_video = all(f['vcodec'] == 'none' or _codec_in(f['vcodec'], MP4_VIDEO_CODECS) for f in inputs)
+        copy_audio = all(f['acodec'] == 'none' or _codec_in(f['acodec'], MP4_AUDIO_CODECS) for f in inputs)
+
+    if (len(inputs) == 1 and copy_video and copy_audio
+            and inputs[0]['ext'] == os.path.splitext(job['output'])[1][1:]
+            and not (inputs[0].get('container') or '').endswith('_dash')):
+        return None
+
+    cmd = [ffmpeg, '-y', '-loglevel', 'error', '-nostdin']
+    for f in inputs:
+        cmd += ['-i', f['path']]
+    for i in range(len(inputs)):
+        if job['mode'] != 'audio':
+            cmd += ['-map', f'{i}:v?']
+        cmd += ['-map', f'{i}:a?']
+
+    if job['mode'] == 'audio':
+        cmd += ['-vn']
+    else:
+        cmd += ['-c:v', 'copy' if copy_video else 'libx264']
+    cmd += ['-c:a', 'copy'] if copy_audio else ['-c:a', 'aac', '-b:a', '192k']
+    return cmd
+
+def run_pp_job(ffmpeg, job, cancel):
+    """ Turn the downloaded streams into the final file. Returns the output path. """
+    if cancel.is_set():
+        raise Exception("Cancelled")
+    output = job['output']
+    cmd = build_pp_command(ffmpeg, job) if ffmpeg else None
+
+    if cmd is None:
+        if len(job['inputs']) > 1:
+            raise Exception("ffmpeg not found, can't merge video and audio")
+        # Nothing to convert, or no ffmpeg to do it with: keep the stream as it came
+        src = job['inputs'][0]['path']
+        if not ffmpeg:
+            output = os.path.splitext(output)[0] + os.path.splitext(src)[1]
+        os.replace(src, output)
+        return output
+
+    temp = os.path.splitext(output)[0] + ".temp" + os.path.splitext(output)[1]
+    flags = subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0
+    proc = subprocess.Popen(cmd + [temp], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            creationflags=flags)
+    while True:
+        try:
+            proc.wait(timeout=0.1)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel.is_set():
+                proc.kill()
+                proc.wait()
+                if os.path.exists(temp):
+                    os.remove(temp)
+                raise Exception("Cancelled")
+    if proc.returncode != 0:
+        raise Exception(f"ffmpeg failed: {proc.stderr.read().decode(errors='replace').strip()}")
+
+    os.replace(temp, output)
+    for f in job['inputs']:
+        if os.path.exists(f['path']):
+            os.remove(f['path'])
+    return output
+
+class PostProcessStage:
+    """ Merge/remux/convert jobs on their own bounded pool of ffmpeg processes.
+
+    Download workers hand a job over and go straight back to the network.
+    """
+    def __init__(self, max_jobs=PP_WORKERS, use_ffmpeg=True):
+        self.pool = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="ytfast-pp")
+        self.ffmpeg = None
+        self.ffmpeg_checked = not use_ffmpeg  # Without ffmpeg streams are kept as downloaded
+
+    def locate_ffmpeg(self, ydl):
+        # Same lookup as yt-dlp (ffmpeg_location, next to the exe, PATH), done once
+        if not self.ffmpeg_checked:
+            from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+            pp = FFmpegPostProcessor(ydl)
+            self.ffmpeg = pp.executable if pp.available else shutil.which("ffmpeg")
+            self.ffmpeg_checked = True
+
+    def submit(self, job, cancel, on_done, on_start=None):
+        """ on_start() and on_done(output_path, error) are called from the pool thread """
+        def run():
+            if on_start:
+                on_start()
+            try:
+                on_done(run_pp_job(self.ffmpeg, job, cancel), None)
+            except Exception as e:
+                on_done(None, e)
+        self.pool.submit(run)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class RateLimiter:
+    """ Token bucket shared by all downloads: a global bytes/sec cap (None = unlimited) """
+    def __init__(self, limit=None):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.tokens = 0.0
+        self.last = time.monotonic()
+
+    def set_limit(self, limit):
+        with self.lock:
+            self.limit = limit or None
+            self.tokens = 0.0
+            self.last = time.monotonic()
+
+    def consume(self, nbytes, cancel):
+        """ Blocks the calling download until nbytes fit under the cap. Returns seconds waited. """
+        with self.lock:
+            if not self.limit:
+                return 0.0
+            now = time.monotonic()
+            # Allow half a second of burst, then go into debt: later callers wait longer
+            self.tokens = min(self.limit * 0.5, self.tokens + (now - self.last) * self.limit)
+            self.last = now
+            self.tokens -= nbytes
+            wait = -self.tokens / self.limit if self.tokens < 0 else 0.0
+        if wait:
+            cancel.wait(wait)
+        return wait
+
+class RateController:
+    """ Per-host AIMD on fragment concurrency and request pacing, plus the global RateLimiter.
+
+    Faster downloads after adding a fragment -> add another; slower -> take it back.
+    429s (or mostly failing downloads) halve the fragments and double the pause
+    between task starts on that host; successes shrink the pause again.
+    """
+    def __init__(self, rate_limit=None):
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.limiter = RateLimiter(rate_limit)
+
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = {
+                'fragments': FRAGMENTS_START, 'delay': 0.0, 'next_start': 0.0,
+                'throughput': None, 'outcomes': collections.deque(maxlen=10), 'throttled': 0,
+            }
+        return state
+
+    def set_rate_limit(self, limit):
+        self.limiter.set_limit(limit)
+
+    def fragments(self, host):
+        with self.lock:
+            return self._state(host)['fragments']
+
+    def delay(self, host):
+        with self.lock:
+            return self._state(host)['delay']
+
+    def reserve_start(self, host):
+        """ Seconds the caller must wait before starting its next task on this host """
+        with self.lock:
+            state = self._state(host)
+            now = time.monotonic()
+            start = max(now, state['next_start'])
+            state['next_start'] = start + state['delay']
+            return start - now
+
+    def throttle(self, nbytes, cancel):
+        return self.limiter.consume(nbytes, cancel)
+
+    def record_success(self, host, nbytes, seconds, capped=False):
+        with self.lock:
+            state = self._state(host)
+            state['outcomes'].append(True)
+            state['delay'] = state['delay'] / 2 if state['delay'] > 0.5 else 0.0
+            if nbytes < RATE_MIN_SAMPLE or seconds <= 0:
+                return
+            throughput = nbytes / seconds
+            previous = state['throughput']
+            # Extra fragments can't help while the global cap is what holds us back
+            if not capped:
+                if previous is None or throughput >= previous * 1.1:
+                    state['fragments'] = min(FRAGMENTS_MAX, state['fragments'] + 1)
+                elif throughput < previous * 0.8:
+                    state['fragments'] = max(FRAGMENTS_MIN, state['fragments'] - 1)
+            state['throughput'] = throughput if previous is None else previous * 0.7 + throughput * 0.3
+
+    def record_error(self, host, error):
+        with self.lock:
+            state = self._state(host)
+            state['outcomes'].append(False)
+            throttled = bool(THROTTLE_RE.search(str(error)))
+            failing = len(state['outcomes']) >= 4 and state['outcomes'].count(False) * 2 >= len(state['outcomes'])
+            if throttled or failing:
+                state['fragments'] = max(FRAGMENTS_MIN, state['fragments'] // 2)
+                state['delay'] = min(PACING_MAX_DELAY, max(2.0, state['delay'] * 2))
+                state['throughput'] = None  # Probe again from the new level
+            if throttled:
+                state['throttled'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {host: {'fragments': s['fragments'], 'delay': round(s['delay'], 2),
+                           'throughput': round(s['throughput'] or 0), 'throttled': s['throttled']}
+                    for host, s in self.hosts.items()}
+
+def _pwrite(fd, data, offset, lock):
+    """ Write data at offset without moving a shared file position (Windows has no pwrite) """
+    view = memoryview(data)
+    if hasattr(os, 'pwrite'):
+        while view:
+            n = os.pwrite(fd, view, offset)
+            view, offset = view[n:], offset + n
+    else:
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while view:
+                view = view[os.write(fd, view):]
+
+class SegmentedDownload:
+    """ One progressive file over several HTTP Range connections, written in place.
+
+    The .part file is preallocated to the full size and each segment writes its bytes at
+    their offset. Segment progress is saved next to it (.part.segments), so a segment that
+    fails, or a download interrupted by a restart, carries on from where it stopped.
+    Requests follow the format's http_chunk_size, so a long segment is several ranges.
+    run() returns False when the server won't do ranges or a new download is too small to
+    split; the caller then downloads it the normal way.
+    """
+    def __init__(self, ydl, fmt, path, connections, cancel, progress_hook=None, retry_hook=None):
+        self.ydl = ydl
+        self.fmt = fmt
+        self.path = path
+        self.part = path + ".part"
+        self.state_path = self.part + ".segments"
+        self.connections = connections
+        self.cancel = cancel
+        self.abort = threading.Event()  # Cancelled, or one segment gave up: the others stop too
+        self.progress_hook = progress_hook
+        self.retry_hook = retry_hook
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.headers = dict(fmt.get('http_headers') or {})
+        self.chunk_size = (fmt.get('downloader_options') or {}).get('http_chunk_size')
+        self.size = None
+        self.segments = []
+        self.downloaded = 0
+        self.unsaved = 0
+        self.started = None
+
+    def _discard(self):
+        """ Drop a segmented .part before yt-dlp resumes it: it's full size, not a prefix """
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+            if os.path.exists(self.part):
+                os.remove(self.part)
+
+    def _request(self, start, end):
+        from yt_dlp.networking import Request
+        return self.ydl.urlopen(Request(self.fmt['url'], headers=dict(self.headers, Range=f"bytes={start}-{end}")))
+
+    def _probe(self, resuming):
+        """ Total size if the server does byte ranges, else None """
+        try:
+            response = self._request(0, 0)
+        except Exception:
+            if resuming:
+                raise  # Say nothing about ranges: keep the segments, the task retries
+            return None
+        try:
+            m = re.match(r"bytes 0-0/(\d+)", response.headers.get('Content-Range') or "")
+            return int(m.group(1)) if response.status == 206 and m else None
+        finally:
+            response.close()
+
+    def _plan(self):
+        state = None
+        if os.path.exists(self.state_path) and os.path.exists(self.part):
+            try:
+                with open(self.state_path, encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = None
+        if state and state.get('size') == self.size and state.get('format_id') == self.fmt.get('format_id'):
+            self.segments = [{'start': a, 'end': b, 'done': done} for a, b, done in state['segments']]
+        else:
+            count = max(1, min(self.connections, self.size // SEGMENT_MIN_SIZE))
+            step = -(-self.size // count)
+            self.segments = [{'start': a, 'end': min(a + step, self.size) - 1, 'done': 0}
+                             for a in range(0, self.size, step)]
+        self.downloaded = sum(seg['done'] for seg in self.segments)
+
+    def _save_state(self):
+        state = {'size': self.size, 'format_id': self.fmt.get('format_id'),
+                 'segments': [[seg['start'], seg['end'], seg['done']] for seg in self.segments]}
+        temp = self.state_path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp, self.state_path)
+
+    def _report(self, downloaded, status="downloading"):
+        if not self.progress_hook:
+            return
+        elapsed = time.monotonic() - self.started
+        speed = downloaded / elapsed if elapsed > 0 else None
+        self.progress_hook({
+            'status': status, 'filename': self.path, 'downloaded_bytes': downloaded,
+            'total_bytes': self.size, 'speed': speed, 'elapsed': elapsed,
+            'eta': (self.size - downloaded) / speed if speed else None,
+            '_percent_str': f"{downloaded / self.size * 100:.1f}%",
+        })
+
+    def _received(self, seg, n):
+        with self.lock:
+            seg['done'] += n
+            self.downloaded += n
+            downloaded = self.downloaded
+            self.unsaved += n
+            if self.unsaved >= SEGMENT_STATE_EVERY:
+                self.unsaved = 0
+                self._save_state()
+        # Outside the lock: the hook may sleep for the rate cap, only this segment waits for it
+        self._report(downloaded)
+
+    def _fetch(self, fd, seg):
+        from yt_dlp.networking.exceptions import HTTPError
+        failures = 0
+        while seg['start'] + seg['done'] <= seg['end']:
+            offset = seg['start'] + seg['done']
+            end = min(seg['end'], offset + self.chunk_size - 1) if self.chunk_size else seg['end']
+            try:
+                response = self._request(offset, end)
+                try:
+                    if response.status != 206:
+                        raise Exception(f"Range request answered with HTTP {response.status}")
+                    while seg['start'] + seg['done'] <= end:
+                        if self.cancel.is_set() or self.abort.is_set():
+                            raise Exception("Cancelled")
+                        want = min(SEGMENT_READ_SIZE, end - seg['start'] - seg['done'] + 1)
+                        data = response.read(want)
+                        if not data:
+                            raise Exception("Connection closed before the segment was complete")
+                        _pwrite(fd, data, seg['start'] + seg['done'], self.write_lock)
+                        self._received(seg, len(data))
+                        failures = 0
+                finally:
+                    response.close()
+            except Exception as e:
+                if "Cancelled" in str(e) or self.cancel.is_set() or self.abort.is_set():
+                    raise
+                failures += 1
+                status = getattr(e, 'status', None) if isinstance(e, HTTPError) else None
+                # 4xx besides timeouts and throttling won't get better by asking again
+                if failures > SEGMENT_RETRIES or (status and 400 <= status < 500 and status not in (408, 429)):
+                    raise
+                if self.retry_hook:
+                    self.retry_hook()
+                if self.cancel.wait(min(30, 2 ** failures)):
+                    raise Exception("Cancelled")
+
+    def _run_segments(self, fd, pending, errors):
+        try:
+            while not self.abort.is_set():
+                try:
+                    seg = pending.popleft()
+                except IndexError:
+                    return
+                self._fetch(fd, seg)
+        except Exception as e:
+            errors.append(e)
+            self.abort.set()
+
+    def run(self):
+        if os.path.exists(self.path) and not os.path.exists(self.part):
+            return False  # Already there, the normal path reports it as done
+        resuming = os.path.exists(self.state_path) and os.path.exists(self.part)
+        self.size = self._probe(resuming)
+        if not self.size:
+            self._discard()  # The server answered, without ranges: start over the normal way
+            return False
+        if not resuming and (self.size < 2 * SEGMENT_MIN_SIZE or self.connections < 2):
+            return False
+        self._plan()
+        self.started = time.monotonic()
+
+        fd = os.open(self.part, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        errors = []
+        try:
+            if os.fstat(fd).st_size != self.size:
+                os.ftruncate(fd, self.size)  # Preallocate
+            self._save_state()
+            # A resume after throttling may be down to one connection, it then takes the segments in turn
+            pending = collections.deque(seg for seg in self.segments if seg['start'] + seg['done'] <= seg['end'])
+            threads = [threading.Thread(target=self._run_segments, args=(fd, pending, errors),
+                                        name="ytfast-segment", daemon=True)
+                       for _ in range(min(len(pending), max(1, self.connections)))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            os.close(fd)
+            with self.lock:
+                if errors or self.cancel.is_set():
+                    self._save_state()  # Next attempt picks the segments up from here
+        if errors:
+            raise errors[0]
+
+        os.replace(self.part, self.path)
+        os.remove(self.state_path)
+        self._report(self.downloaded, "finished")
+        return True
+
+class DownloaderSession:
+    """ A YoutubeDL that outlives one task, so it keeps its connections and cookies """
+    def __init__(self, profile, ydl_opts, extractors=()):
+        import yt_dlp
+        self.profile = profile
+        ydl_opts = dict(ydl_opts, logger=self)  # To count retries, yt-dlp only reports those as text
+        if extractors:
+            # Extra extractors go first, the built-in Generic one would claim any URL otherwise
+            self.ydl = yt_dlp.YoutubeDL(ydl_opts, auto_init=False)
+            for ie in extractors:
+                self.ydl.add_info_extractor(ie())
+            self.ydl.add_default_info_extractors()
+        else:
+            self.ydl = yt_dlp.YoutubeDL(ydl_opts)
+        self.progress_hook = None  # Set per task by whoever checked the session out
+        self.retry_hook = None
+        self.ydl.add_progress_hook(self._on_progress)
+
+    def _on_progress(self, d):
+        if self.progress_hook:
+            self.progress_hook(d)
+
+    # yt-dlp logger interface
+    def debug(self, msg):
+        if self.retry_hook and "Retrying" in msg:
+            self.retry_hook()
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        print(msg, file=sys.stderr)
+
+    def close(self):
+        self.ydl.close()
+
+class SessionPool:
+    """ Idle DownloaderSessions per option profile. A session is used by one task at a time. """
+    def __init__(self, opts_factory=build_ydl_opts, max_idle=MAX_WORKERS, extractors=()):
+        self.opts_factory = opts_factory
+        self.max_idle = max_idle
+        self.extractors = extractors  # Extra InfoExtractor classes, e.g. bench/fakemedia.py's
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, profile):
+        with self.lock:
+            idle = self.idle.get(profile)
+            if idle:
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+        return DownloaderSession(profile, self.opts_factory(profile), self.extractors)
+
+    def prewarm(self, profile):
+        """ Build a session for this profile ahead of time and park it as idle """
+        session = DownloaderSession(profile, self.opts_factory(profile), self.extractors)
+        with self.lock:
+            self.created += 1
+        self.release(session)
+
+    def release(self, session, discard=False):
+        session.progress_hook = None
+        session.retry_hook = None
+        with self.lock:
+            idle = self.idle.setdefault(session.profile, [])
+            if not discard and len(idle) < self.max_idle:
+                idle.append(session)
+                return
+        session.close()
+
+    def close(self):
+        with self.lock:
+            sessions = [s for idle in self.idle.values() for s in idle]
+            self.idle = {}
+        for session in sessions:
+            session.close()
+
+# One YoutubeDL per extraction process, made by the pool initializer
+_process_ydl = None
+
+def _init_extract_process(ydl_opts, extractors):
+    global _process_ydl
+    _process_ydl = DownloaderSession(None, ydl_opts, extractors).ydl
+
+def _extract_in_process(url, ie_key):
+    try:
+        info = _process_ydl.extract_info(url, download=False, ie_key=ie_key, process=False)
+    except Exception as e:
+        # yt-dlp's exceptions don't all survive pickling, the message is what we use anyway
+        raise Exception(str(e)) from None
+    if info is None:
+        raise Exception(f"Could not extract {url}")
+    if info.get('_type') in ('playlist', 'multi_video'):
+        return None
+    return compact_info(_process_ydl, info)
+
+def compact_info(ydl, info):
+    """ JSON-safe info dict without the fields the download doesn't need """
+    info = ydl.sanitize_info(info, remove_private_keys=True)
+    for key in COMPACT_DROP_KEYS:
+        info.pop(key, None)
+    return info
+
+class ExtractionPool:
+    """ Runs extract_info() in worker processes, off the GIL the downloads and the UI share.
+
+    Page parsing and player JS (signature / n-parameter) scale with cores this way.
+    Only extraction moves: the download threads still do format selection and the transfer.
+    """
+    def __init__(self, processes=None, opts_factory=build_ydl_opts, extractors=()):
+        # spawn, not fork: forking a process full of threads (and Tk) isn't safe
+        self.pool = ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_extract_process,
+                                        initargs=(opts_factory(('video', 'best')), tuple(extractors)))
+
+    def extract(self, url, ie_key=None):
+        """ Compact info dict, or None for playlists: their entries are listed lazily, which
+        only works with the extractor in this process. """
+        return self.pool.submit(_extract_in_process, url, ie_key).result()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class TaskJournal:
+    """ Write-ahead record of unfinished tasks and app settings.
+
+    Every state change is committed before the download moves on, so after a crash or
+    close the queue can be rebuilt and in-flight downloads resumed from their .part files.
+    """
+    def __init__(self, db_path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # Survives app crashes, WAL keeps it cheap
+        self.db.execute("""CREATE TABLE IF NOT EXISTS tasks (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE, url TEXT, settings TEXT,
+            title TEXT, state TEXT DEFAULT 'queued', skip INTEGER DEFAULT 0)""")
+        self.db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def add(self, task_id, url, settings, title=None):
+        # OR IGNORE: restored tasks keep their original place in the queue
+        self._execute("INSERT OR IGNORE INTO tasks (id, url, settings, title) VALUES (?, ?, ?, ?)",
+                      (task_id, url, json.dumps(settings), title))
+
+    def set_state(self, task_id, state):
+        self._execute("UPDATE tasks SET state = ? WHERE id = ?", (state, task_id))
+
+    def set_title(self, task_id, title):
+        self._execute("UPDATE tasks SET title = ? WHERE id = ?", (title, task_id))
+
+    def set_settings(self, task_id, settings):
+        self._execute("UPDATE tasks SET settings = ? WHERE id = ?", (json.dumps(settings), task_id))
+
+    def set_skip(self, task_id, skip):
+        self._execute("UPDATE tasks SET skip = ? WHERE id = ?", (skip, task_id))
+
+    def finish(self, task_id):
+        self._execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def unfinished(self):
+        rows = self._execute("SELECT id, url, settings, title, state, skip FROM tasks ORDER BY seq")
+        return [{'id': r[0], 'url': r[1], 'settings': json.loads(r[2]), 'title': r[3],
+                 'state': r[4], 'skip': r[5]} for r in rows]
+
+    def get_setting(self, key, default=None):
+        rows = self._execute("SELECT value FROM settings WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def set_setting(self, key, value):
+        self._execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, json.dumps(value)))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+def estimate_size(ydl, info, settings):
+    """ Expected download size in bytes from extracted info, None if there's no telling """
+    if info.get('_type') in ('playlist', 'multi_video'):
+        return 0  # Listing is quick, and lets the entries compete on their own
+    try:
+        # Same format selection the download will do, on a copy
+        selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+    except Exception:
+        selected = info
+    streams = selected.get('requested_formats') or [selected]
+    size = sum(f.get('filesize') or f.get('filesize_approx') or 0 for f in streams)
+    return size or estimate_size_from_duration(info.get('duration'), settings)
+
+def estimate_size_from_duration(duration, settings):
+    if not duration:
+        return None
+    quality = 'audio' if settings.get('mode') == 'audio' else settings.get('quality', 'best')
+    return int(duration * BITRATE_ESTIMATES.get(quality, BITRATE_ESTIMATES['best']))
+
+class TaskScheduler:
+    """ Waiting tasks, handed to workers by pin, lane and (optionally) size instead of FIFO.
+
+    Order: pinned tasks (latest pin first), then tasks that waited STARVATION_SECONDS,
+    then by lane, with shortest-job-first inside a lane when sjf is on. Waiting ages a
+    task up the lanes and shrinks its size, so nothing sits behind newer work forever.
+    Per-host caps live here too: get() skips tasks whose host is at its limit.
+    A claimed task (being probed) holds a slot of its host and isn't handed out.
+    Waiting time comes from clock (time.monotonic by default), so it can be faked.
+    """
+    def __init__(self, per_host_limit=PER_HOST_LIMIT, sjf=False, clock=time.monotonic):
+        self.cond = threading.Condition()
+        self.clock = clock
+        self.waiting = {}  # task_id -> task
+        self.per_host_limit = per_host_limit
+        self.host_active = {}
+        self.sjf = sjf
+        self.seq = itertools.count()
+        self.pins = itertools.count(1)
+
+    def put(self, task):
+        with self.cond:
+            # A retried task keeps its place and its waiting time
+            if 'seq' not in task:
+                task['seq'] = next(self.seq)
+                task['enqueued'] = self.clock()
+            self.waiting[task['id']] = task
+            self.cond.notify()
+
+    def _key(self, task, now):
+        if task.get('pinned'):
+            return (0, -task['pinned'])
+        wait = now - task['enqueued']
+        if wait >= STARVATION_SECONDS:
+            return (1, task['seq'])
+        aging = int(wait // AGING_SECONDS)
+        lane = max(0, PRIORITY_LANES.index(task['priority']) - aging)
+        size = 0
+        if self.sjf:
+            size = task.get('size')
+            size = (SJF_DEFAULT_SIZE if size is None else size) / (1 + wait / AGING_SECONDS)
+        return (2, lane, size, task['seq'])
+
+    def ordered(self):
+        """ Waiting tasks in the order they'd be handed out (ignoring host caps) """
+        with self.cond:
+            now = self.clock()
+            return sorted(self.waiting.values(), key=lambda t: self._key(t, now))
+
+    def get(self, timeout=1, ready=None):
+        """ Best waiting task whose host has a free slot (the slot is now taken), or None.
+
+        Nothing is handed out while the ready event (if any) is clear.
+        """
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                now = self.clock()
+                best, best_key = None, None
+                for task in (self.waiting.values() if ready is None or ready.is_set() else ()):
+                    if task.get('claimed') or self.host_active.get(task['host'], 0) >= self.per_host_limit:
+                        continue
+                    if task.get('retry_at') and task['retry_at'] > now and not task['cancel'].is_set():
+                        continue
+                    key = self._key(task, now)
+                    if best is None or key < best_key:
+                        best, best_key = task, key
+                if best is not None:
+                    del self.waiting[best['id']]
+                    self.host_active[best['host']] = self.host_active.get(best['host'], 0) + 1
+                    return best
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+    def release(self, host):
+        with self.cond:
+            self.host_active[host] -= 1
+            self.cond.notify_all()
+
+    def claim(self, task):
+        """ Keep a waiting task from workers and take a slot of its host. False if it's gone or the host is full. """
+        with self.cond:
+            if task['id'] not in self.waiting or self.host_active.get(task['host'], 0) >= self.per_host_limit:
+                return False
+            task['claimed'] = True
+            self.host_active[task['host']] = self.host_active.get(task['host'], 0) + 1
+            return True
+
+    def unclaim(self, task):
+        with self.cond:
+            task['claimed'] = False
+            self.host_active[task['host']] -= 1
+            self.cond.notify_all()
+
+    def set_priority(self, task_id, lane):
+        with self.cond:
+            task = self.waiting.get(task_id)
+            if task is None or lane not in PRIORITY_LANES:
+                return False
+            task['priority'] = lane
+            return True
+
+    def pin(self, task_id, pinned=True):
+        with self.cond:
+            task = self.waiting.get(task_id)
+            if task is None:
+                return False
+            task['pinned'] = next(self.pins) if pinned else None
+            return True
+
+    def move(self, task_id, step):
+        """ Swap places with the neighbour step (-1 up, +1 down) in the same lane, queue order.
+        Returns the neighbour's id, or None if nothing moved.
+
+        Only changes anything among equals: with sjf on, size decides first.
+        """
+        with self.cond:
+            task = self.waiting.get(task_id)
+            if task is None:
+                return None
+            lane = sorted((t for t in self.waiting.values() if t['priority'] == task['priority']),
+                          key=lambda t: t['seq'])
+            i = lane.index(task) + step
+            if not 0 <= i < len(lane):
+                return None
+            task['seq'], lane[i]['seq'] = lane[i]['seq'], task['seq']
+            return lane[i]['id']
+
+class DownloadManager:
+    def __init__(self, update_callback, max_workers=MAX_WORKERS, per_host_limit=PER_HOST_LIMIT,
+                 info_cache=None, sessions=None, journal=None, archive=None, postprocess=None,
+                 rate=None, metrics=None, sjf=False, extract_pool=None):
+        self.tasks = {}  # task_id -> task, for everything queued or running
+        self.expanding = {}  # task_id -> playlist task whose entries are still being listed
+        self.postprocessing = {}  # task_id -> task downloaded and waiting for / running ffmpeg
+        self.notify = update_callback
+        self.update_callback = self._broadcast  # Also reaches duplicates attached to a task
+        self.info_cache = info_cache
+        self.sessions = sessions or SessionPool()
+        self.journal = journal
+        self.archive = archive
+        self.postprocess = postprocess or PostProcessStage()
+        self.rate = rate or RateController()
+        self.metrics = metrics or MetricsRegistry()
+        self.extract_pool = extract_pool  # Optional ExtractionPool
+        self.is_running = True
+        self.warm = threading.Event()  # Workers start taking tasks once this is set, see warm_up()
+        self.warm.set()
+        self.sizing = threading.Event()  # Set while shortest-first is on: the size prober has work
+        if sjf:
+            self.sizing.set()
+
+        # Number of extractor runs, should stay at one per task
+        self.stats_lock = threading.Lock()
+        self.extract_count = 0
+
+        # Single flight: one transfer per video and profile, duplicates follow the running task
+        self.inflight_lock = threading.Lock()
+        self.inflight = {}   # dedupe key -> task_id
+        self.followers = {}  # task_id -> ids of duplicate submissions following it
+
+        # Waiting tasks, their order and the per-host concurrency caps
+        self.scheduler = TaskScheduler(per_host_limit, sjf=sjf)
+
+        self.workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"ytfast-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        threading.Thread(target=self._size_prober, name="ytfast-sizer", daemon=True).start()
+
+    def add_task(self, url, settings, task_id, title=None, skip=0, size=None):
+        """ Queue a download. Returns the id of the task doing it: an earlier task for the
+        same video and profile if one is still in flight (task_id then follows that one). """
+        key = archive_key(dedupe_key(url), settings)
+        with self.inflight_lock:
+            existing = self.inflight.get(key)
+            if existing is not None:
+                self.followers.setdefault(existing, []).append(task_id)
+            else:
+                self.inflight[key] = task_id
+        if existing is not None:
+            if self.journal:
+                self.journal.finish(task_id)  # e.g. restored twice, the original carries it
+            self.notify(task_id, "status", "Already queued, following it")
+            return existing
+
+        task = {
+            'url': url,
+            'settings': settings,
+            'id': task_id,
+            'host': host_key(url),
+            'cancel': threading.Event(),
+            'skip': skip,  # Playlist entries already queued before a restart
+            'priority': settings.get('priority') if settings.get('priority') in PRIORITY_LANES else "normal",
+            'pinned': None,
+            'size': size,  # Expected bytes, for shortest-first
+            'dedupe': key,
+        }
+        if self.journal:
+            self.journal.add(task_id, url, settings, title)
+        self.metrics.start(task)
+        self.tasks[task_id] = task
+        self.scheduler.put(task)
+        return task_id
+
+    def _broadcast(self, task_id, update_type, value):
+        self.notify(task_id, update_type, value)
+        followers = self.followers.get(task_id)
+        if followers:
+            for follower in list(followers):
+                self.notify(follower, update_type, value)
+            if update_type == "status" and value in FINISHED_STATUSES:
+                with self.inflight_lock:
+                    self.followers.pop(task_id, None)
+
+    def restore(self):
+        """ Re-queue whatever the journal says was unfinished when we last stopped """
+        restored = 0
+        for row in self.journal.unfinished():
+            self.update_callback(row['id'], "added", {'title': row['title'] or row['url'],
+                                                      'path': row['settings'].get('path'), 'url': row['url']})
+            if row['state'] == 'running':
+                # yt-dlp picks up the .part / fragment files where they stopped
+                self.update_callback(row['id'], "status", "Resuming...")
+            self.add_task(row['url'], row['settings'], row['id'], skip=row['skip'])
+            restored += 1
+        return restored
+
+    def cancel_task(self, task_id):
+        # A duplicate just stops following, the task it follows keeps going
+        with self.inflight_lock:
+            for followers in self.followers.values():
+                if task_id in followers:
+                    followers.remove(task_id)
+                    break
+            else:
+                followers = None
+        if followers is not None:
+            self.notify(task_id, "status", "Cancelled")
+            return
+
+        task = self.tasks.get(task_id) or self.expanding.get(task_id) or self.postprocessing.get(task_id)
+        if task:
+            task['cancel'].set()
+
+    def set_priority(self, task_id, lane):
+        """ Move a waiting task to another lane. False if it already started. """
+        if not self.scheduler.set_priority(task_id, lane):
+            return False
+        task = self.tasks[task_id]
+        task['settings']['priority'] = lane
+        if self.journal:
+            self.journal.set_settings(task_id, task['settings'])
+        self._post_queue_status(task)
+        return True
+
+    def pin_task(self, task_id, pinned=True):
+        """ Pinned tasks start before anything else, the latest pin first """
+        if not self.scheduler.pin(task_id, pinned):
+            return False
+        self._post_queue_status(self.tasks[task_id])
+        return True
+
+    def move_task(self, task_id, step):
+        return self.scheduler.move(task_id, step)
+
+    def set_shortest_first(self, enabled):
+        self.scheduler.sjf = enabled
+        if enabled:
+            self.sizing.set()
+        else:
+            self.sizing.clear()
+
+    def _post_queue_status(self, task):
+        if task['pinned']:
+            status = "Queued (pinned)"
+        elif task['priority'] != "normal":
+            status = f"Queued ({task['priority']} priority)"
+        else:
+            status = "Queued"
+        self.update_callback(task['id'], "status", status)
+
+    def busy(self):
+        return bool(self.tasks or self.expanding or self.postprocessing)
+
+    def shutdown(self):
+        # Anything still queued or running stays in the journal and is resumed next start
+        self.is_running = False
+        for task in list(self.tasks.values()) + list(self.postprocessing.values()):
+            task['cancel'].set()
+        self.postprocess.shutdown()
+        if self.extract_pool:
+            self.extract_pool.shutdown()
+        self.sessions.close()
+
+    def warm_up(self, profiles=(('video', 'best'),)):
+        """ Import yt-dlp and build sessions on a background thread, so a front-end can show
+        its window first. Tasks added meanwhile wait in the queue. """
+        self.warm.clear()
+        threading.Thread(target=self._warm_up, args=(tuple(profiles),), name="ytfast-warmup", daemon=True).start()
+
+    def _warm_up(self, profiles):
+        try:
+            _extractor_classes()  # Imports yt_dlp and every extractor, video_key() needs them all
+            for profile in profiles:
+                self.sessions.prewarm(profile)
+        except Exception as e:
+            print(f"Warm-up failed: {e}", file=sys.stderr)  # Tasks build what they need themselves
+        finally:
+            self.warm.set()
+
+    def _worker_loop(self):
+        while self.is_running:
+            # Checked inside get(): warm_up() may start after the workers did
+            task = self.scheduler.get(ready=self.warm)
+            if task is None:
+                continue
+            task['retry_at'] = None
+            try:
+                self._run_task(task)
+            finally:
+                self.scheduler.release(task['host'])
+                if task['retry_at'] and self.is_running:
+                    self.scheduler.put(task)  # Transient failure, comes back after its backoff
+                else:
+                    self.tasks.pop(task['id'], None)
+
+    def _size_prober(self):
+        """ Shortest-first needs sizes: extract the next few unsized waiting tasks ahead of the workers.
+
+        The info is kept on the task, so the download doesn't extract a second time.
+        """
+        while self.is_running:
+            # Shortest-first off (the default): no sorting the queue for nothing
+            if not self.sizing.wait(timeout=1) or not self.warm.wait(timeout=1):
+                continue
+            unsized = [t for t in self.scheduler.ordered() if t['size'] is None and not t.get('probed')]
+            if not unsized:
+                time.sleep(1)
+                continue
+            for task in unsized[:SIZE_PROBE_AHEAD]:
+                if not self.is_running or not self.scheduler.sjf:
+                    break
+                # Held like a running task: no worker takes it mid-probe and its host's cap counts it
+                if not self.scheduler.claim(task):
+                    continue
+                try:
+                    task['probed'] = True
+                    self._probe_size(task)
+                finally:
+                    self.scheduler.unclaim(task)
+
+    def _probe_size(self, task):
+        settings = task['settings']
+        # Probing is a request to the host like any other, it waits for the host's pacing
+        if task['cancel'].wait(self.rate.reserve_start(task['host'])):
+            return
+        session = self.sessions.acquire((settings['mode'], settings.get('quality', 'best')))
+        ok = False
+        try:
+            info = self._get_info(session.ydl, task['url'])
+            if info.get('_type') not in ('playlist', 'multi_video'):
+                task['info'] = info  # Playlist entries are listed through the session that extracted them
+            task['size'] = estimate_size(session.ydl, info, settings)
+            ok = True
+        except Exception:
+            pass  # The download runs into the same problem and reports it
+        finally:
+            self.sessions.release(session, discard=not ok)
+
+    def _run_task(self, task):
+        cancel = task['cancel']
+        self.metrics.mark(task, 'started')
+        if cancel.is_set():
+            self._finish(task, "Cancelled")
+            return
+
+        # Archive check straight from the URL, before yt-dlp or the network get involved
+        key = archive_key(video_key(task['url']), task['settings']) if self.archive is not None else None
+        if key and key in self.archive:
+            self._finish(task, "Already downloaded")
+            return
+
+        if self.journal:
+            self.journal.set_state(task['id'], 'running')
+        self.update_callback(task['id'], "status", "Initializing...")
+        self.update_callback(task['id'], "progress", 0.0)
+
+        try:
+            if not self._process_download(task):
+                return  # Handed off, whoever took it reports the final status
+            if not cancel.is_set():
+                self._finish(task, "Completed")
+            else:
+                self._finish(task, "Cancelled")
+        except AlreadyDownloaded:
+            self._finish(task, "Already downloaded")
+        except Exception as e:
+            err_msg = str(e)
+            if "Cancelled" in err_msg or cancel.is_set():
+                self._finish(task, "Cancelled")
+            else:
+                self.rate.record_error(task['host'], e)
+                if self._retry_later(task, e):
+                    return
+                print(f"Error: {e}", file=sys.stderr)
+                task.pop('resolved', None)
+                self._finish(task, "Error")
+                # Don't hand the same (possibly stale) info to a retry
+                if self.info_cache and video_key(task['url']):
+                    self.info_cache.invalidate(video_key(task['url']))
+
+    def _retry_later(self, task, error):
+        """ Re-queue after a transient failure, with backoff. False if it's not worth another try.
+
+        Partial downloads stay: yt-dlp resumes .part files and fragments, SegmentedDownload its
+        segments. The extracted info is reused unless the stream URLs expired (403/410).
+        """
+        attempts = task.get('attempts', 0) + 1
+        if attempts > TASK_RETRIES or not TRANSIENT_RE.search(str(error)):
+            return False
+        task['attempts'] = attempts
+        self.metrics.count(task, 'retries')
+
+        info = task.pop('resolved', None)
+        if EXPIRED_RE.search(str(error)):
+            if self.info_cache and video_key(task['url']):
+                self.info_cache.invalidate(video_key(task['url']))
+        elif info is not None:
+            task['info'] = info
+
+        delay = min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** (attempts - 1))
+        task['retry_at'] = self.scheduler.clock() + delay
+        print(f"Retrying in {delay}s ({attempts}/{TASK_RETRIES}): {error}", file=sys.stderr)
+        self.update_callback(task['id'], "status", f"Retrying in {delay}s ({attempts}/{TASK_RETRIES})...")
+        return True
+
+    def _finish(self, task, status):
+        if status == "Cancelled" and not self.is_running:
+            return  # Stopped by shutdown, not by the user: keep it in the journal
+        with self.inflight_lock:
+            if self.inflight.get(task['dedupe']) == task['id']:
+                del self.inflight[task['dedupe']]
+        # Per-phase durations, e.g. queue vs. extraction vs. transfer vs. ffmpeg
+        self.update_callback(task['id'], "timing", self.metrics.finish(task, status))
+        if self.journal:
+            self.journal.finish(task['id'])
+        if status in ("Completed", "Already downloaded"):
+            self.update_callback(task['id'], "progress", 1.0)
+        self.update_callback(task['id'], "status", status)
+
+    def _progress_hook(self, d, task):
+        if task['cancel'].is_set():
+            raise Exception("Cancelled by user")
+
+        # Bytes since the last report go through the global rate cap
+        if d['status'] in ('downloading', 'finished'):
+            done = d.get('downloaded_bytes') or 0
+            # Segment threads report concurrently and may arrive out of order: only count growth
+            with self.stats_lock:
+                seen = task.setdefault('bytes_seen', {})
+                # First report for a file is the baseline, so resumed .part bytes don't count
+                delta = done - seen.get(d.get('filename'), done)
+                seen[d.get('filename')] = max(done, seen.get(d.get('filename'), done))
+            if delta > 0:
+                task['bytes'] = task.get('bytes', 0) + delta
+                task['throttled'] = task.get('throttled', 0.0) + self.rate.throttle(delta, task['cancel'])
+            self.metrics.progress(task, d)
+
+        if d['status'] == 'downloading':
+            try:
+                p = d.get('_percent_str', '0%').replace('%','')
+                progress = float(p) / 100
+                self.update_callback(task['id'], "progress", progress)
+                self.update_callback(task['id'], "status", f"Downloading... {d.get('_percent_str')}")
+            except:
+                pass
+
+    def _process_download(self, task):
+        """ Returns False if the task was handed off instead of finished here """
+        url = task['url']
+        mode = task['settings']['mode'] 
+        quality = task['settings'].get('quality', 'best')
+        path = task['settings'].get('path', os.getcwd())
+
+        # Pacing: a host that's been throttling us gets its task starts spread out
+        wait = self.rate.reserve_start(task['host'])
+        if wait > 0:
+            self.update_callback(task['id'], "status", f"Waiting {wait:.0f}s (rate limited)...")
+            if task['cancel'].wait(wait): raise Exception("Cancelled")
+
+        session = self.sessions.acquire((mode, quality))
+        session.progress_hook = lambda d: self._progress_hook(d, task)
+        session.retry_hook = lambda: self.metrics.count(task, 'retries')
+        session.ydl.params['paths'] = {'home': path}
+        session.ydl.params['concurrent_fragment_downloads'] = self.rate.fragments(task['host'])
+        session.ydl.params['sleep_interval_requests'] = self.rate.delay(task['host'])
+        ok = False
+        handed_off = False
+        try:
+            ydl = session.ydl
+            if task['cancel'].is_set(): raise Exception("Cancelled")
+            
+            # Extracted ahead of time by the size prober, unless its stream URLs are about to expire
+            info = task.pop('info', None)
+            expires = info and stream_expiry(info)
+            if info is None or (expires and expires <= time.time() + 15 * 60):
+                info = self._get_info(ydl, url)
+            self.metrics.mark(task, 'extracted')
+            title = info.get('title', 'Unknown Title')
+            self.update_callback(task['id'], "title", title)
+            if self.journal:
+                self.journal.set_title(task['id'], title)
+            
+            if task['cancel'].is_set(): raise Exception("Cancelled")
+
+            # URLs we couldn't key up front (e.g. redirects) get checked once we know the id
+            key = None
+            if self.archive is not None and info.get('extractor_key') != "Generic":  # Generic ids aren't stable
+                key = archive_key(info_key(info), task['settings'])
+            if key and key in self.archive:
+                raise AlreadyDownloaded()
+
+            if info.get('_type') in ('playlist', 'multi_video'):
+                # Entries are pulled lazily by the session's extractor, so the expander keeps the session
+                self.expanding[task['id']] = task
+                threading.Thread(target=self._expand_playlist, args=(task, info, session),
+                                 name="ytfast-expander", daemon=True).start()
+                handed_off = True
+                return False
+            
+            # A clean copy for a retry after a transient failure (format selection changes info)
+            task['resolved'] = ydl.sanitize_info(info, remove_private_keys=True)
+            self.postprocess.locate_ffmpeg(ydl)
+            self.metrics.mark(task, 'download_start')
+            job = self._download_streams(ydl, info, task)
+            task.pop('resolved', None)
+            self.metrics.mark(task, 'download_end')
+            seconds = self.metrics.duration(task, 'download')
+            self.rate.record_success(task['host'], task.get('bytes', 0), seconds,
+                                     capped=task.get('throttled', 0.0) > seconds * 0.1)
+            ok = True
+        finally:
+            # A session that blew up mid-task may be in a weird state, don't reuse it
+            if not handed_off:
+                self.sessions.release(session, discard=not ok)
+
+        # Merging/converting happens on the post-processing stage, this worker moves on
+        self.postprocessing[task['id']] = task
+        self.update_callback(task['id'], "status", "Waiting for ffmpeg...")
+        self.postprocess.submit(job, task['cancel'],
+                                lambda output, error: self._postprocess_done(task, key, output, error),
+                                on_start=lambda: self._postprocess_started(task))
+        return False
+
+    def _download_streams(self, ydl, info, task):
+        """ Format selection, then download the chosen stream(s) as served. Returns the ffmpeg job. """
+        # Selection works on the info we already have, no second extractor run
+        selected = ydl.process_ie_result(info, download=False)
+        streams = selected.get('requested_formats') or [selected]
+
+        stem = os.path.splitext(ydl.prepare_filename(selected))[0]
+        os.makedirs(os.path.dirname(stem) or '.', exist_ok=True)
+        inputs = []
+        for f in streams:
+            if task['cancel'].is_set(): raise Exception("Cancelled")
+            stream_info = dict(selected)
+            stream_info.pop('requested_formats', None)
+            stream_info.update(f)
+            path = f"{stem}.f{f['format_id']}.{f['ext']}"
+            if not self._download_segmented(ydl, stream_info, path, task):
+                success, _ = ydl.dl(path, stream_info)
+                if not success:
+                    raise Exception(f"Download failed: {path}")
+            inputs.append({'path': path, 'ext': f['ext'], 'container': f.get('container'),
+                           'vcodec': f.get('vcodec') or 'none', 'acodec': f.get('acodec') or 'none'})
+
+        task['metrics']['streams'] = len(inputs)
+        mode = task['settings']['mode']
+        return {'mode': mode, 'inputs': inputs, 'output': stem + ('.m4a' if mode == 'audio' else '.mp4')}
+
+    def _download_segmented(self, ydl, fmt, path, task):
+        """ Progressive (single file over HTTP) formats over several connections. False if not done. """
+        if fmt.get('protocol') not in ('http', 'https') or fmt.get('fragments'):
+            return False  # DASH/HLS: yt-dlp's fragment downloader already runs them in parallel
+        download = SegmentedDownload(ydl, fmt, path, self.rate.fragments(task['host']), task['cancel'],
+                                     progress_hook=lambda d: self._progress_hook(d, task),
+                                     retry_hook=lambda: self.metrics.count(task, 'retries'))
+        return download.run()
+
+    def _postprocess_started(self, task):
+        self.metrics.mark(task, 'pp_start')
+        self.update_callback(task['id'], "status", "Processing...")
+
+    def _postprocess_done(self, task, key, output, error):
+        self.postprocessing.pop(task['id'], None)
+        self.metrics.mark(task, 'pp_end')
+
+        if error is not None:
+            if "Cancelled" in str(error) or task['cancel'].is_set():
+                self._finish(task, "Cancelled")
+            else:
+                print(f"Error: {error}", file=sys.stderr)
+                self._finish(task, "Error")
+            return
+
+        if key:
+            self.archive.add(key, output)
+        self._finish(task, "Completed")
+
+    def _expand_playlist(self, task, info, session):
+        """ Turn playlist entries into their own tasks as they are discovered """
+        cancel = task['cancel']
+        path = task['settings'].get('path', os.getcwd())
+        count = 0
+        archived = 0
+        consumed = 0  # Entries dealt with, queued or archived: where a restart picks up
+        ok = False
+        try:
+            self.update_callback(task['id'], "status", "Listing playlist...")
+            for entry in iter_playlist_entries(info):
+                if cancel.is_set() or not self.is_running:
+                    break
+                entry_url = entry and (entry.get('url') or entry.get('webpage_url'))
+                if not entry_url:
+                    continue  # Unavailable / private entry
+                if consumed < task['skip']:
+                    consumed += 1  # Dealt with before a restart, a queued child task was restored on its own
+                    count += 1
+                    continue
+                # Flat entries carry extractor + id, so the archive filters them with no request at all
+                if self.archive is not None and entry.get('ie_key') and entry.get('id'):
+                    if archive_key(f"{entry['ie_key']}:{entry['id']}", task['settings']) in self.archive:
+                        archived += 1
+                        consumed += 1
+                        continue
+
+                # Backpressure: don't list further ahead than the downloads can use
+                while len(self.tasks) >= EXPAND_MAX_PENDING and not cancel.is_set() and self.is_running:
+                    time.sleep(0.5)
+
+                child_id = str(uuid.uuid4())
+                self.update_callback(child_id, "added", {'title': entry.get('title') or entry_url, 'path': path})
+                self.add_task(entry_url, dict(task['settings']), child_id, title=entry.get('title'),
+                              size=estimate_size_from_duration(entry.get('duration'), task['settings']))
+                count += 1
+                consumed += 1
+                if self.journal:
+                    self.journal.set_skip(task['id'], consumed)
+                self.update_callback(task['id'], "status", f"Listing playlist... {count} queued")
+            ok = True
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+        finally:
+            self.expanding.pop(task['id'], None)
+            self.sessions.release(session, discard=not ok)
+
+        if cancel.is_set():
+            self._finish(task, "Cancelled")
+        elif not self.is_running:
+            return  # Shutdown, listing continues after the next start
+        elif not ok:
+            self._finish(task, "Error")
+        else:
+            skipped = f", {archived} already downloaded" if archived else ""
+            self.update_callback(task['id'], "title", f"{info.get('title') or task['url']} ({count} videos{skipped})")
+            self._finish(task, "Completed")
+
+    def _get_info(self, ydl, url):
+        key = video_key(url) if self.info_cache else None
+        if key:
+            info = self.info_cache.get(key)
+            if info is not None:
+                return info
+
+        info = self._extract(ydl, url)
+        # Plain redirects (e.g. channel -> its videos tab) are followed here so playlists get expanded
+        while info.get('_type') == 'url':
+            info = self._extract(ydl, info['url'], info.get('ie_key'))
+        # Only single videos are cached, playlists are resolved lazily on download
+        if self.info_cache and info.get('_type', 'video') == 'video' and info_key(info):
+            self.info_cache.put(info_key(info), ydl.sanitize_info(info, remove_private_keys=True))
+        return info
+
+    def _extract(self, ydl, url, ie_key=None):
+        info = None
+        # Known playlists go straight to this process, the pool would only extract them to hand them back
+        if self.extract_pool and not is_playlist_url(url):
+            info = self.extract_pool.extract(url, ie_key)
+            if info is None:
+                with self.stats_lock:
+                    self.extract_count += 1  # A playlist after all: the pool's run counts too
+        if info is None:
+            # process=False: just run the extractor, format selection happens on download
+            info = ydl.extract_info(url, download=False, ie_key=ie_key, process=False)
+        with self.stats_lock:
+            self.extract_count += 1
+        if info is None:
+            raise Exception(f"Could not extract {url}")
+        return info
+
+# -----------------------------------------------------------------------------
+# METRICS
+# -----------------------------------------------------------------------------
+
+# phase -> (from mark, to mark)
+PHASES = {
+    'queue': ('queued', 'started'),
+    'extract': ('started', 'extracted'),
+    'download': ('download_start', 'download_end'),
+    'pp_wait': ('download_end', 'pp_start'),
+    'postprocess': ('pp_start', 'pp_end'),
+    'total': ('queued', 'finished'),
+}
+
+def _quantile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+class MetricsRegistry:
+    """ Per-task phase timestamps, bytes, speed, retries and fragments, plus totals.
+
+    Each task carries its record in task['metrics']; finished records move to a
+    bounded history. Export with snapshot() (JSON), prometheus() or write(path).
+    """
+    def __init__(self, history=METRICS_HISTORY):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.finished = collections.deque(maxlen=history)
+        self.status_counts = collections.Counter()
+        self.totals = collections.Counter()
+        self.phase_totals = {phase: [0, 0.0] for phase in PHASES}  # phase -> [count, seconds]
+        self.started_at = time.time()
+
+    def start(self, task):
+        record = {'id': task['id'], 'url': task['url'], 'host': task['host'], 'status': "Queued",
+                  'queued_at': time.time(), 'marks': {'queued': time.monotonic()},
+                  'bytes': 0, 'peak_speed': 0.0, 'retries': 0, 'fragments': {}, 'streams': 0}
+        task['metrics'] = record
+        with self.lock:
+            self.active[task['id']] = record
+
+    def mark(self, task, name):
+        task['metrics']['marks'][name] = time.monotonic()
+
+    def count(self, task, field, n=1):
+        task['metrics'][field] += n
+
+    def progress(self, task, d):
+        record = task['metrics']
+        record['bytes'] = task.get('bytes', 0)
+        if d.get('speed'):
+            record['peak_speed'] = max(record['peak_speed'], d['speed'])
+        if d.get('fragment_count'):
+            record['fragments'][d.get('filename')] = d['fragment_count']
+
+    def duration(self, task, phase):
+        return self._durations(task['metrics']).get(phase, 0.0)
+
+    def _durations(self, record):
+        marks = record['marks']
+        return {phase: round(marks[end] - marks[start], 3)
+                for phase, (start, end) in PHASES.items() if start in marks and end in marks}
+
+    def _export(self, record):
+        download = self._durations(record).get('download')
+        return {
+            'id': record['id'], 'url': record['url'], 'host': record['host'], 'status': record['status'],
+            'queued_at': round(record['queued_at'], 3), 'phases': self._durations(record),
+            'bytes': record['bytes'], 'avg_speed': round(record['bytes'] / download) if download else None,
+            'peak_speed': round(record['peak_speed']), 'retries': record['retries'],
+            'fragments': sum(dict(record['fragments']).values()), 'streams': record['streams'],
+        }
+
+    def finish(self, task, status):
+        """ Returns the task's phase durations """
+        record = task['metrics']
+        record['marks']['finished'] = time.monotonic()
+        record['status'] = status
+        durations = self._durations(record)
+        with self.lock:
+            self.active.pop(task['id'], None)
+            self.finished.append(record)
+            self.status_counts[status] += 1
+            self.totals['bytes'] += record['bytes']
+            self.totals['retries'] += record['retries']
+            self.totals['fragments'] += sum(record['fragments'].values())
+            for phase, seconds in durations.items():
+                self.phase_totals[phase][0] += 1
+                self.phase_totals[phase][1] += seconds
+        return durations
+
+    def snapshot(self, include_tasks=True):
+        with self.lock:
+            active = list(self.active.values())
+            finished = list(self.finished)
+            status_counts = dict(self.status_counts)
+            totals = dict(self.totals)
+            phase_totals = {phase: list(v) for phase, v in self.phase_totals.items()}
+
+        phases = {}
+        for phase, (count, seconds) in phase_totals.items():
+            recent = sorted(d[phase] for d in map(self._durations, finished) if phase in d)
+            phases[phase] = {'count': count, 'sum': round(seconds, 3), 'avg': round(seconds / count, 3) if count else None,
+                             'p50': _quantile(recent, 0.5), 'p95': _quantile(recent, 0.95)}
+
+        snapshot = {
+            'uptime': round(time.time() - self.started_at, 3),
+            'active': len(active),
+            'finished': status_counts,
+            'bytes': totals.get('bytes', 0),
+            'retries': totals.get('retries', 0),
+            'fragments': totals.get('fragments', 0),
+            'phases': phases,
+        }
+        if include_tasks:
+            snapshot['tasks'] = [self._export(r) for r in active + finished]
+        return snapshot
+
+    def prometheus(self):
+        snap = self.snapshot(include_tasks=False)
+        lines = [
+            "# HELP ytfast_tasks_active Tasks queued, downloading or post-processing",
+            "# TYPE ytfast_tasks_active gauge",
+            f"ytfast_tasks_active {snap['active']}",
+            "# HELP ytfast_tasks_total Finished tasks by final status",
+            "# TYPE ytfast_tasks_total counter",
+        ]
+        lines += [f'ytfast_tasks_total{{status="{status}"}} {n}' for status, n in sorted(snap['finished'].items())]
+        for name, help_text in (('bytes', "Bytes downloaded"), ('retries', "Retries reported by yt-dlp"),
+                                ('fragments', "Fragments of DASH/HLS downloads")):
+            lines += [f"# HELP ytfast_{name}_total {help_text}", f"# TYPE ytfast_{name}_total counter",
+                      f"ytfast_{name}_total {snap[name]}"]
+        lines += ["# HELP ytfast_phase_seconds Time per task phase (quantiles over recent tasks)",
+                  "# TYPE ytfast_phase_seconds summary"]
+        for phase, stats in snap['phases'].items():
+            for q in ('p50', 'p95'):
+                if stats[q] is not None:
+                    lines.append(f'ytfast_phase_seconds{{phase="{phase}",quantile="0.{q[1:]}"}} {stats[q]}')
+            lines.append(f'ytfast_phase_seconds_sum{{phase="{phase}"}} {stats["sum"]}')
+            lines.append(f'ytfast_phase_seconds_count{{phase="{phase}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """ .prom/.txt -> Prometheus text, anything else -> JSON """
+        if path.endswith((".prom", ".txt")):
+            data = self.prometheus()
+        else:
+            data = json.dumps(self.snapshot(), indent=1)
+        temp = path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(temp, path)
+
+class MetricsServer:
+    """ GET /metrics (Prometheus text) and /metrics.json on localhost """
+    def __init__(self, registry, port, host="127.0.0.1"):
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, name="ytfast-metrics", daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# -----------------------------------------------------------------------------
+# UI UPDATE BUS
+# -----------------------------------------------------------------------------
+
+class UpdateBus:
+    """ Thread-safe buffer of the latest value per (task, update type).
+
+    Workers post as often as they like, the UI drains everything in one batch per frame.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.posted = 0   # Updates from workers (= Tk callbacks with one after() per update)
+        self.drains = 0   # Batches handed to the UI (= Tk callbacks now)
+
+    def post(self, task_id, update_type, value):
+        with self.lock:
+            self.pending.setdefault(task_id, {})[update_type] = value
+            self.posted += 1
+
+    def drain(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+            self.drains += 1
+        return batch
+
+    def counters(self):
+        with self.lock:
+            return self.posted, self.drains
+
+# -----------------------------------------------------------------------------
+# DAEMON (one engine, many front-ends)
+# -----------------------------------------------------------------------------
+
+class TaskBoard:
+    """ Latest value per (task, update type) like UpdateBus, but versioned instead of drained.
+
+    Any number of remote clients ask for "everything newer than version N", so each
+    gets its own coalesced view. Finished tasks past history are forgotten, oldest first.
+    """
+    def __init__(self, history=DAEMON_HISTORY):
+        self.cond = threading.Condition()
+        self.version = 0
+        self.tasks = {}  # task_id -> {update_type: (version, value)}
+        self.finished = collections.deque()
+        self.history = history
+
+    def post(self, task_id, update_type, value):
+        with self.cond:
+            self.version += 1
+            fields = self.tasks.setdefault(task_id, {})
+            was_finished = fields.get('status', (0, None))[1] in FINISHED_STATUSES
+            fields[update_type] = (self.version, value)
+            if update_type == 'status' and value in FINISHED_STATUSES and not was_finished:
+                self.finished.append(task_id)
+                while len(self.finished) > self.history:
+                    self.tasks.pop(self.finished.popleft(), None)
+            self.cond.notify_all()
+
+    def changes(self, since, timeout=0):
+        """ (version, {task_id: {update_type: value}}) newer than since, waits up to timeout for any """
+        with self.cond:
+            if since > self.version:
+                since = 0  # Client remembers an earlier daemon, start over
+            self.cond.wait_for(lambda: self.version > since, timeout)
+            changes = {}
+            for task_id, fields in self.tasks.items():
+                new = {update_type: value for update_type, (version, value) in fields.items() if version > since}
+                if new:
+                    changes[task_id] = new
+            return self.version, changes
+
+def check_settings(settings):
+    """ Task settings from a client, checked before they reach the engine threads (TypeError if bad) """
+    if not isinstance(settings, dict):
+        raise TypeError("settings must be an object")
+    mode = settings.get('mode', 'video')
+    if mode not in ('video', 'audio'):
+        raise TypeError(f"Unknown mode {mode!r}")
+    quality = str(settings.get('quality', 'best'))
+    if quality != 'best' and not quality.isdigit():
+        raise TypeError(f"Unknown quality {quality!r}")
+    path = settings.get('path')
+    if path is not None and not isinstance(path, str):
+        raise TypeError("path must be a string")
+    return {**settings, 'mode': mode, 'quality': quality}
+
+class EngineServer:
+    """ JSON-RPC 2.0 over HTTP on localhost (POST /rpc) in front of one DownloadManager.
+
+    Every request needs "Authorization: Bearer <token>", so web pages can't submit.
+    Methods (params by name):
+        submit(url, settings, id=None, title=None, skip=0) -> id of the task doing it (see add_task)
+        cancel(task_id)
+        poll(since=0, timeout=20) -> {version, updates}       busy()
+        set_priority(task_id, lane), pin(task_id, pinned=True), move(task_id, step) -> id swapped with
+        set_shortest_first(enabled), set_rate_limit(limit), hosts(), metrics(include_tasks=True),
+        prometheus(), ping()
+    poll() is the progress subscription: it returns once something changed after version
+    since, with the latest value of each changed field ("added", "title", "progress", "status", "timing").
+    """
+    def __init__(self, manager, board, port=0, host="127.0.0.1", token=None):
+        self.manager = manager
+        self.board = board
+        self.token = token or secrets.token_hex(16)
+        methods = {
+            'ping': lambda: True,
+            'submit': self.submit,
+            'cancel': manager.cancel_task,
+            'poll': self.poll,
+            'busy': manager.busy,
+            'set_priority': manager.set_priority,
+            'pin': manager.pin_task,
+            'move': manager.move_task,
+            'set_shortest_first': manager.set_shortest_first,
+            'set_rate_limit': manager.rate.set_rate_limit,
+            'hosts': manager.rate.snapshot,
+            'metrics': manager.metrics.snapshot,
+            'prometheus': manager.metrics.prometheus,
+        }
+        token = self.token
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != "/rpc":
+                    self.send_error(404)
+                    return
+                if self.headers.get("Authorization") != f"Bearer {token}":
+                    self.send_error(401)
+                    return
+                request_id = None
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    request_id = request.get('id')
+                    method = methods.get(request.get('method'))
+                    if method is None:
+                        reply = {'error': {'code': -32601, 'message': f"Unknown method {request.get('method')!r}"}}
+                    else:
+                        params = request.get('params') or {}
+                        result = method(**params) if isinstance(params, dict) else method(*params)
+                        reply = {'result': result}
+                except ValueError as e:
+                    reply = {'error': {'code': -32700, 'message': f"Bad request: {e}"}}
+                except TypeError as e:
+                    reply = {'error': {'code': -32602, 'message': str(e)}}
+                except Exception as e:
+                    reply = {'error': {'code': -32000, 'message': str(e)}}
+
+                body = json.dumps({'jsonrpc': "2.0", 'id': request_id, **reply}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_port
+
+    def submit(self, url, settings, id=None, title=None, skip=0):
+        settings = check_settings(settings)
+        task_id = id or str(uuid.uuid4())
+        # Posted here so every client sees the new task, not just the one that submitted it
+        self.board.post(task_id, "added", {'title': title or url, 'path': settings.get('path'), 'url': url})
+        return self.manager.add_task(url, settings, task_id, title=title, skip=int(skip))
+
+    def poll(self, since=0, timeout=DAEMON_POLL_TIMEOUT):
+        version, updates = self.board.changes(since, min(timeout, DAEMON_POLL_TIMEOUT))
+        return {'version': version, 'updates': updates}
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def daemon_file():
+    """ Where a running daemon leaves its port and token for clients """
+    return os.path.join(app_data_dir(), "daemon.json")
+
+class RpcError(Exception):
+    """ Error reply from the daemon: the call reached it and failed there """
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+class EngineClient:
+    """ Calls into a running EngineServer """
+    def __init__(self, port, token, host="127.0.0.1"):
+        self.url = f"http://{host}:{port}/rpc"
+        self.token = token
+        self.ids = itertools.count(1)
+
+    def call(self, method, params=None, timeout=10):
+        body = json.dumps({'jsonrpc': "2.0", 'method': method, 'params': params or {}, 'id': next(self.ids)})
+        request = urllib.request.Request(self.url, body.encode(), {
+            'Content-Type': "application/json", 'Authorization': f"Bearer {self.token}"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            reply = json.loads(response.read())
+        if 'error' in reply:
+            error = reply['error'] if isinstance(reply['error'], dict) else {}
+            raise RpcError(error.get('message', "Unknown error"), error.get('code'))
+        return reply['result']
+
+def connect_daemon():
+    """ EngineClient for the running daemon, None if there isn't one """
+    try:
+        with open(daemon_file(), encoding="utf-8") as f:
+            info = json.load(f)
+        client = EngineClient(info['port'], info['token'])
+        client.call('ping', timeout=2)
+        return client
+    except (OSError, ValueError, KeyError, RpcError):
+        return None
+
+class RemoteRate:
+    def __init__(self, client):
+        self.client = client
+
+    def set_rate_limit(self, limit):
+        self.client.call('set_rate_limit', {'limit': limit})
+
+    def snapshot(self):
+        return self.client.call('hosts')
+
+class RemoteMetrics:
+    def __init__(self, client):
+        self.client = client
+
+    def snapshot(self, include_tasks=True):
+        return self.client.call('metrics', {'include_tasks': include_tasks})
+
+    def prometheus(self):
+        return self.client.call('prometheus')
+
+    write = MetricsRegistry.write
+
+class RemoteManager:
+    """ Stands in for DownloadManager when a daemon runs the downloads.
+
+    Calls go over JSON-RPC; a background thread long-polls the daemon and feeds its
+    updates to update_callback, so front-ends can't tell the difference. The first
+    poll brings in every task the daemon knows, including other clients' tasks.
+    """
+    def __init__(self, update_callback, client, journal=None):
+        self.update_callback = update_callback
+        self.client = client
+        self.journal = journal  # The front-end's own, the daemon keeps a separate one
+        self.rate = RemoteRate(client)
+        self.metrics = RemoteMetrics(client)
+        self.version = 0
+        self.is_running = True
+        self.warm = threading.Event()
+        self.warm.set()  # Nothing to warm up on this side
+        threading.Thread(target=self._poll_loop, name="ytfast-remote", daemon=True).start()
+
+    def _poll_loop(self):
+        while self.is_running:
+            try:
+                result = self.client.call('poll', {'since': self.version}, timeout=DAEMON_POLL_TIMEOUT + 10)
+                version = int(result['version'])
+                changes = {task_id: updates for task_id, updates in result['updates'].items()
+                           if isinstance(updates, dict)}
+            except (OSError, ValueError):
+                time.sleep(1)  # Daemon busy or restarting
+                continue
+            except (RpcError, KeyError, TypeError, AttributeError) as e:
+                # An error reply (e.g. the daemon shutting down) or a malformed one: keep polling
+                print(f"Daemon poll failed: {e!r}", file=sys.stderr)
+                time.sleep(1)
+                continue
+            self.version = version
+            for task_id, updates in changes.items():
+                for update_type in sorted(updates, key=lambda t: t != "added"):
+                    self.update_callback(task_id, update_type, updates[update_type])
+
+    def add_task(self, url, settings, task_id, title=None, skip=0):
+        return self.client.call('submit', {'url': url, 'settings': settings, 'id': task_id, 'title': title, 'skip': skip})
+
+    def restore(self):
+        """ Hand what this front-end left unfinished to the daemon, which journals it from now on """
+        restored = 0
+        for row in self.journal.unfinished() if self.journal else ():
+            self.add_task(row['url'], row['settings'], row['id'], title=row['title'], skip=row['skip'])
+            self.journal.finish(row['id'])
+            restored += 1
+        return restored
+
+    def warm_up(self, profiles=()):
+        pass
+
+    def cancel_task(self, task_id):
+        self.client.call('cancel', {'task_id': task_id})
+
+    def set_priority(self, task_id, lane):
+        return self.client.call('set_priority', {'task_id': task_id, 'lane': lane})
+
+    def pin_task(self, task_id, pinned=True):
+        return self.client.call('pin', {'task_id': task_id, 'pinned': pinned})
+
+    def move_task(self, task_id, step):
+        return self.client.call('move', {'task_id': task_id, 'step': step})
+
+    def set_shortest_first(self, enabled):
+        self.client.call('set_shortest_first', {'enabled': enabled})
+
+    def busy(self):
+        return self.client.call('busy')
+
+    def shutdown(self):
+        # Only this front-end goes away, the daemon keeps downloading
+        self.is_running = False
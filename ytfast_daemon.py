@@ -0,0 +1,85 @@
+"""
+YTFast daemon: one download engine on localhost that every front-end shares.
+
+    python ytfast_daemon.py
+    python ytfast_daemon.py --workers 4 --limit-rate 5M
+
+While it runs, the GUI (YTFast.py) and `ytfast_cli.py --connect` submit to it instead
+of starting their own engine, so they share one queue, one info cache, one archive
+and the warm yt-dlp sessions. Scripts can talk to it directly: JSON-RPC 2.0 over
+HTTP, POST http://127.0.0.1:<port>/rpc with "Authorization: Bearer <token>". Port
+and token are in daemon.json in the app data folder. See EngineServer for the methods.
+
+Ctrl+C stops it; unfinished tasks stay in the journal and resume on the next start.
+"""
+import argparse
+import json
+import os
+import sys
+
+from ytfast_core import (DownloadManager, DownloadArchive, EngineServer, ExtractionPool, InfoCache,
+                         MetricsServer, TaskBoard, TaskJournal, EXTRACT_PROCESSES, MAX_WORKERS,
+                         PER_HOST_LIMIT, app_data_dir, connect_daemon, daemon_file)
+from ytfast_cli import parse_rate
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shared download engine for the GUI, the CLI and scripts.")
+    parser.add_argument("--port", type=int, default=0, help="Port on 127.0.0.1 (default: any free one)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Parallel downloads")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_LIMIT, help="Parallel downloads per site")
+    parser.add_argument("--limit-rate", type=parse_rate, default=None, metavar="RATE",
+                        help="Total download speed cap, e.g. 500K or 4M (bytes/s)")
+    parser.add_argument("--shortest-first", action="store_true", help="Start the smallest downloads first")
+    parser.add_argument("--extract-processes", type=int, default=EXTRACT_PROCESSES, metavar="N",
+                        help="Run extraction in N worker processes (default: 0, in-process)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="Serve /metrics and /metrics.json on localhost")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if connect_daemon():
+        print("A YTFast daemon is already running", file=sys.stderr)
+        return 1
+
+    board = TaskBoard()
+    info_cache = InfoCache(os.path.join(app_data_dir(), "info_cache.db"))
+    # Not the GUI's journal.db: a standalone GUI must not have its tasks re-queued here
+    journal = TaskJournal(os.path.join(app_data_dir(), "daemon_journal.db"))
+    archive = DownloadArchive(os.path.join(app_data_dir(), "archive.db"))
+    manager = DownloadManager(board.post, max_workers=args.workers, per_host_limit=args.per_host,
+                              info_cache=info_cache, journal=journal, archive=archive, sjf=args.shortest_first,
+                              extract_pool=ExtractionPool(args.extract_processes) if args.extract_processes else None)
+    manager.rate.set_rate_limit(args.limit_rate)
+    metrics_server = MetricsServer(manager.metrics, args.metrics_port) if args.metrics_port else None
+    server = EngineServer(manager, board, port=args.port)
+
+    # Only the owner of this account can read the token
+    path = daemon_file()
+    temp = path + ".tmp"
+    with open(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+        json.dump({'port': server.port, 'token': server.token, 'pid': os.getpid()}, f)
+    os.replace(temp, path)
+
+    restored = manager.restore()
+    print(f"YTFast daemon on 127.0.0.1:{server.port} ({restored} tasks resumed)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        server.close()
+        manager.shutdown()
+        if metrics_server:
+            metrics_server.close()
+        info_cache.close()
+        journal.close()
+        archive.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())